@@ -0,0 +1,179 @@
+'''
+Adaptive pacing of API calls.
+The delay between calls is controlled with AIMD (additive increase,
+multiplicative decrease of the call rate): each successful call
+shortens the delay by a small constant while a throttled (429) or
+failed (5xx) call multiplies it. This converges to the fastest
+polling rate the API accepts.
+ConcurrencyLimiter applies the same idea to the number of API calls
+that may be in flight at the same time.
+'''
+import time
+import threading
+
+# The lowest delay in seconds to back off to after a throttled call.
+MIN_BACKOFF_DELAY = 1
+
+# Statuses of throttled calls which are retried by ConcurrencyLimiter.
+RETRY_STATUSES = frozenset([429, 503])
+
+
+def status_code(error):
+    '''
+    Get the HTTP status code of an API error.
+
+    Arguments:
+    error (Exception) : alpaca_trade_api APIError or requests HTTPError.
+
+    Returns: int or None if the status code is not known.
+    '''
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def retry_after(error, default=1):
+    '''
+    Get the number of seconds from the Retry-After header of an API error.
+
+    Arguments:
+    error (Exception) : alpaca_trade_api APIError or requests HTTPError.
+    default (float) : Returned if the header is missing or not numeric.
+
+    Returns: float
+    '''
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return default
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return default
+
+
+def is_backoff_status(status):
+    '''
+    Check if a response status means that the calls should slow down.
+    '''
+    return status is not None and (status == 429 or status >= 500)
+
+
+class AdaptivePacer:
+    '''
+    AIMD controller for the delay between API calls.
+
+    Arguments:
+    delay (float) : The initial delay in seconds.
+    min_delay (float) : The lowest delay. Defaults to the initial delay.
+    max_delay (float) : The highest delay.
+    alpha (float) : Subtracted from the delay after each successful call.
+    beta (float) : The delay is multiplied by it after a throttled call.
+    '''
+    def __init__(self, delay, min_delay=None, max_delay=60, alpha=0.05, beta=2.0):
+        self.delay = delay
+        self.min_delay = delay if min_delay is None else min_delay
+        self.max_delay = max_delay
+        self.alpha = alpha
+        self.beta = beta
+        self._lock = threading.Lock()
+
+    def get_delay(self, delay=None):
+        '''
+        Get the current delay.
+
+        Arguments:
+        delay (float) : Return this delay instead, unless the pacer is
+                        backing off.
+        '''
+        if delay is None or self.delay > self.min_delay:
+            return self.delay
+        return delay
+
+    def wait(self, delay=None):
+        '''
+        Sleep for the current delay, see get_delay.
+        '''
+        time.sleep(self.get_delay(delay))
+
+    def report(self, error=None):
+        '''
+        Update the delay with the outcome of an API call.
+
+        Arguments:
+        error (Exception) : The error raised by the call, None on success.
+        '''
+        with self._lock:
+            if error is None:
+                self.delay = max(self.min_delay, self.delay - self.alpha)
+            elif is_backoff_status(status_code(error)):
+                delay = max(self.delay * self.beta, MIN_BACKOFF_DELAY)
+                self.delay = min(self.max_delay, delay)
+
+
+class ConcurrencyLimiter:
+    '''
+    AIMD limit of the number of concurrent API calls. The number of
+    permits is halved when a call is throttled (429 or 503) and grows
+    by one after increase_after consecutive successful calls. Throttled
+    calls are retried after the delay in their Retry-After header.
+
+    Arguments:
+    permits (int) : The initial number of permits.
+    max_permits (int) : The highest number of permits.
+    increase_after (int) : Successful calls needed to add a permit.
+    retries (int) : The number of retries of a throttled call.
+    rate_limiter (TokenBucket) : Acquired before each attempt if given.
+    '''
+    def __init__(self, permits=8, max_permits=8, increase_after=20,
+                 retries=3, rate_limiter=None):
+        self.permits = permits
+        self.max_permits = max_permits
+        self.increase_after = increase_after
+        self.retries = retries
+        self.rate_limiter = rate_limiter
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def call(self, func, *args, **kwargs):
+        '''
+        Call func when a permit is available.
+        Errors other than throttling are raised immediately, a throttled
+        call is raised when it runs out of retries.
+
+        Returns: The return value of func.
+        '''
+        for attempt in range(self.retries + 1):
+            self._acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as err:
+                throttled = status_code(err) in RETRY_STATUSES
+                self._release(throttled=throttled)
+                if not throttled or attempt == self.retries:
+                    raise
+                time.sleep(retry_after(err))
+            else:
+                self._release()
+                return result
+
+    def _acquire(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        with self._condition:
+            while self._in_flight >= self.permits:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def _release(self, throttled=False):
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self.permits = max(1, self.permits // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.increase_after:
+                    self.permits = min(self.max_permits, self.permits + 1)
+                    self._successes = 0
+            self._condition.notify_all()
@@ -0,0 +1,117 @@
+'''
+Shared construction of the Alpaca REST client.
+The client is created once per process and reused by all callers so
+the underlying HTTP connections (and TLS sessions) are kept alive
+between API calls.
+'''
+import time
+import config
+import functools
+import threading
+import alpaca_trade_api as tradeapi
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+# The number of connection pools to cache and the maximum number of
+# connections to keep in each pool.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+
+# The number of seconds between the requests which keep idle
+# connections open.
+KEEP_ALIVE_INTERVAL = 30
+
+_kept_alive = set()
+_keep_alive_lock = threading.Lock()
+
+
+def get_base_url(use_sandbox):
+    '''
+    Get the Alpaca API base url.
+
+    Arguments:
+    use_sandbox (bool) : Use the paper-trading API.
+
+    Returns: str
+    '''
+    if use_sandbox:
+        return 'https://paper-api.alpaca.markets'
+    return 'https://api.alpaca.markets'
+
+
+def get_client():
+    '''
+    Get the Alpaca API client for the credentials from config.py.
+    Successive calls return the same client.
+
+    Returns: alpaca_trade_api.REST
+    '''
+    settings = config.get_settings()
+    return get_shared_client(
+        settings.api_key, settings.api_secret, settings.use_sandbox)
+
+
+@functools.lru_cache(maxsize=None)
+def get_shared_client(api_key, api_secret, use_sandbox):
+    '''
+    Create the Alpaca API client for a set of credentials. All callers
+    (e.g. the Trader threads) using the same credentials share one client
+    and its connection pool.
+
+    Arguments:
+    api_key (str) : The api key.
+    api_secret (str) : The api secret.
+    use_sandbox (bool) : Use the paper-trading API.
+
+    Returns: alpaca_trade_api.REST
+    '''
+    client = tradeapi.REST(
+        key_id=api_key,
+        secret_key=api_secret,
+        base_url=get_base_url(use_sandbox),
+        api_version='v2')
+
+    # Replace the default session with one using a larger connection pool.
+    # The calls are not retried by the adapter or by the client (which by
+    # default sleeps and retries 429 and 504 responses) because the callers
+    # retry them with their own backoff, e.g. trader.API_LIMITER.
+    session = Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=0)
+    session.mount('https://', adapter)
+    client._session = session
+    client._retry = 0
+
+    return client
+
+
+def _ping(client):
+    '''
+    Request the market clock every KEEP_ALIVE_INTERVAL seconds.
+    '''
+    while True:
+        time.sleep(KEEP_ALIVE_INTERVAL)
+        try:
+            client.get_clock()
+        except Exception:
+            # The next API call will reconnect if the ping failed.
+            pass
+
+
+def keep_alive(client):
+    '''
+    Keep the connections of a client warm between updates with a
+    background thread, so the API calls don't wait for a new TCP and
+    TLS handshake. Only one thread is started per client.
+
+    Arguments:
+    client (alpaca_trade_api.REST) : The client.
+    '''
+    with _keep_alive_lock:
+        if id(client) in _kept_alive:
+            return
+        _kept_alive.add(id(client))
+    threading.Thread(
+        target=_ping, args=(client,), name='keep_alive', daemon=True).start()
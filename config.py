@@ -1,10 +1,26 @@
 '''
 General configuration variables for Trader.
+
+Each variable can be overridden with an environment variable named
+TRADER_ followed by the variable name in upper case, for example
+TRADER_LOG_LEVEL=DEBUG. The values in effect are read once with
+get_settings(). New variables have to be added to Settings as well.
 '''
+import os
+import functools
+import dataclasses
+
+# Load the environment variables from a .env file if python-dotenv is installed.
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
 
-# API credentials.
-api_key = ''
-api_secret = ''
+# API credentials. These are read from the environment variables used by
+# the Alpaca SDK so they don't have to be stored in this file.
+api_key = os.environ.get('APCA_API_KEY_ID', '')
+api_secret = os.environ.get('APCA_API_SECRET_KEY', '')
 
 # Set to True in order to use paper-trading.
 use_sandbox = True
@@ -19,14 +35,22 @@ log_file = 'my_log_file.txt'
 console_log = True
 
 # If there are any errors the system will wait for sleep_after_errors
-# seconds before retrying.
+# seconds before retrying. The wait is doubled with each consecutive
+# error up to max_sleep_after_error seconds and a random part of it is
+# used so multiple traders don't retry at the same time.
 sleep_after_error = 1
+max_sleep_after_error = 30
 
 # The update time is the number of seconds to wait before attempting data pull.
 # Note that the API rate limit is 200 calls per minute, which means that we can make
 # approximately 3 calls per second. Therefore the minimal safe value for update_time is 0.3
 update_time = 1
 
+# If the API is throttling or failing the update time will be increased
+# automatically up to max_update_time seconds and decreased back to
+# update_time once the API calls are successful again.
+max_update_time = 60
+
 # The number of retries if the attempt to create new order gets rejected. After the number of
 # retries is reached Trader will terminate itself.
 retry_order_creation = 2
@@ -35,10 +59,56 @@ retry_order_creation = 2
 order_status_check_delay = 3
 
 # The Sendgrid API key used for email monitoring.
-sendgrid_api_key = ''
+sendgrid_api_key = os.environ.get('SENDGRID_API_KEY', '')
 
 # The sending email address used for email monitoring.
 email_monitoring_sending_email = 'trader@trader.io'
 
 # The receiving email address used for email monitoring.
 email_monitoring_receiving_email = ''
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    '''
+    The configuration values in effect. Use get_settings() to get it.
+    '''
+    api_key: str
+    api_secret: str
+    use_sandbox: bool
+    log_level: str
+    log_file: str
+    console_log: bool
+    sleep_after_error: float
+    max_sleep_after_error: float
+    update_time: float
+    max_update_time: float
+    retry_order_creation: int
+    order_status_check_delay: float
+    sendgrid_api_key: str
+    email_monitoring_sending_email: str
+    email_monitoring_receiving_email: str
+
+
+def _env_value(field):
+    '''
+    Get the value of a setting from its environment variable, falling
+    back to the value defined in this module.
+    '''
+    value = os.environ.get('TRADER_{}'.format(field.name.upper()))
+    if value is None:
+        return globals()[field.name]
+    if field.type is bool:
+        return value.lower() in ('1', 'true', 'yes')
+    return field.type(value)
+
+
+@functools.lru_cache(maxsize=1)
+def get_settings():
+    '''
+    Read the configuration once and return it as Settings.
+
+    Returns: Settings
+    '''
+    values = {f.name: _env_value(f) for f in dataclasses.fields(Settings)}
+    return Settings(**values)
@@ -10,6 +10,13 @@ Args:
     The data for which to pull data in YYYY-MM-DD format.
     If not specified the data for the current day will
     be pulled.
+-date_range (str)
+    The range of dates for which to pull data in
+    "YYYY-MM-DD - YYYY-MM-DD" format. Can't be used
+    together with -date.
+-verbose
+    Print the pulled orders. By default only the number
+    of orders is printed.
 
 Example:
 python3 day_executions -output my_file.csv -date 2020-07-24
@@ -17,20 +24,34 @@ python3 day_executions -output my_file.csv -date 2020-07-24
 import os
 import csv
 import pytz
-import config
+import shutil
 import socket
 import pathlib
 import argparse
 import datetime
 import http.server
+import collections
 import socketserver
-import alpaca_trade_api as tradeapi
+import rate_limiter
+import alpaca_client
+import adaptive_pacer
+from concurrent.futures import ThreadPoolExecutor
+
+# The number of days to pull data for in parallel.
+FETCH_WORKERS = 4
+
+# The maximum number of orders returned by a single API call.
+PAGE_SIZE = 500
+
+# The dates are given in the timezone of the exchange.
+TZ_NY = pytz.timezone('America/New_York')
 
 
 def serve(filename):
-    os.system('mkdir tmp')
-    os.system('cp {0} tmp/{0}'.format(filename))
-    os.chdir('tmp/')
+    serve_dir = pathlib.Path('tmp')
+    serve_dir.mkdir(exist_ok=True)
+    shutil.copyfile(filename, serve_dir / pathlib.Path(filename).name)
+    os.chdir(serve_dir)
 
     hostname = socket.gethostname()
     ip_address = socket.gethostbyname(hostname)
@@ -41,15 +62,115 @@ def serve(filename):
             httpd.serve_forever()
 
 
-def to_csv(rows, filename):
+def to_csv(pages, filename):
+    '''
+    Append rows to a CSV file as they arrive. The rows are given in
+    pages (lists of dicts) and the header is taken from the first row.
+    Each page is yielded back after it is written.
+    '''
     f = pathlib.Path(filename)
-    add_header = not f.exists()
-    writer = csv.DictWriter(
-        f.open('a', newline=''),
-        fieldnames=rows[0].keys())
-    if add_header:
-        writer.writeheader()
-    writer.writerows(rows)
+    add_header = not f.exists() or f.stat().st_size == 0
+    fields = None
+    with f.open('a', newline='') as csv_file:
+        writer = csv.writer(csv_file, quoting=csv.QUOTE_MINIMAL)
+        for rows in pages:
+            if rows:
+                if fields is None:
+                    fields = tuple(rows[0])
+                    if add_header:
+                        writer.writerow(fields)
+                writer.writerows(tuple(r.get(k) for k in fields) for r in rows)
+            yield rows
+
+
+def fetch_orders(client, limiter, pacer, start_date, end_date):
+    '''
+    Pull all orders submitted between start_date and end_date.
+    The API returns at most PAGE_SIZE orders per call so the orders
+    are pulled in pages, moving the start of the range to the last
+    received order until an incomplete page is returned. Throttled
+    calls are retried by the limiter.
+
+    Returns: list of dicts
+    '''
+    orders = []
+    received = set()
+    cursor = start_date.isoformat()
+    while True:
+        pacer.wait()
+        try:
+            page = limiter.call(
+                client.list_orders,
+                limit=PAGE_SIZE,
+                after=cursor,
+                until=end_date.isoformat(),
+                direction='asc',
+                status='all')
+        except Exception as err:
+            pacer.report(err)
+            raise
+        pacer.report()
+
+        new_orders = [o._raw for o in page if o._raw['id'] not in received]
+        received.update(o['id'] for o in new_orders)
+        orders.extend(new_orders)
+        if len(page) < PAGE_SIZE:
+            return orders
+
+        # The start of the range is exclusive, so the next page starts just
+        # before the second of the last order. That way the orders submitted
+        # at the same time are not skipped, and the repeated ones are dropped
+        # by their id. If the whole page was repeated the range is moved past
+        # the last order, otherwise the same page would be pulled forever.
+        last = page[-1]._raw['submitted_at']
+        if new_orders:
+            submitted = datetime.datetime.fromisoformat(last[:19] + '+00:00')
+            cursor = (submitted - datetime.timedelta(microseconds=1)).isoformat()
+        else:
+            cursor = last
+
+
+def fetch_days(executor, fetch, dates):
+    '''
+    Fetch the days in parallel and yield the result of each day in the
+    order of the dates. The next day is submitted only when a result is
+    consumed so at most FETCH_WORKERS days are held in memory ahead of
+    a slow consumer.
+
+    Arguments:
+    executor (ThreadPoolExecutor) : The executor.
+    fetch (function) : Called with each date.
+    dates (list) : The dates.
+    '''
+    pending = collections.deque()
+    for date in dates:
+        if len(pending) >= FETCH_WORKERS:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fetch, date))
+    while pending:
+        yield pending.popleft().result()
+
+
+def day_ranges(start_date, end_date):
+    '''
+    Split the days from start_date to end_date (inclusive) into
+    [start, end] pairs, one per day, in the New York timezone.
+
+    Arguments:
+    start_date (str) : The first day in YYYY-MM-DD format.
+    end_date (str) : The last day in YYYY-MM-DD format.
+
+    Returns: list
+    '''
+    start_date = datetime.datetime.fromisoformat(start_date)
+    end_date = datetime.datetime.fromisoformat(end_date)
+
+    # Each midnight is localized on its own (replace(tzinfo=...) would use
+    # the LMT offset of pytz) so the days are right across DST changes.
+    one_day = datetime.timedelta(days=1)
+    days = (end_date - start_date).days + 1
+    midnights = [TZ_NY.localize(start_date + i * one_day) for i in range(days + 1)]
+    return [[midnights[i], midnights[i + 1]] for i in range(days)]
 
 
 def arguments():
@@ -62,71 +183,57 @@ def arguments():
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('-output', type=str, default=None,
                         help='the output filename')
-    parser.add_argument('-date', type=str, default=None,
-                        help='the date to pull data for in YYYY-MM-DD format')
-    parser.add_argument('-date_range', type=str, default=None,
-                        help='the date range to pull data for in YYYY-MM-DD format')
+    dates = parser.add_mutually_exclusive_group()
+    dates.add_argument('-date', type=str, default=None,
+                       help='the date to pull data for in YYYY-MM-DD format')
+    dates.add_argument('-date_range', type=str, default=None,
+                       help='the date range to pull data for in YYYY-MM-DD format')
+    parser.add_argument('-verbose', action='store_true',
+                        help='print the pulled orders')
     return parser.parse_args()
 
 
 def main():
-    # Set the base url.
-    if config.use_sandbox:
-        base_url = 'https://paper-api.alpaca.markets'
-    else:
-        base_url = 'https://api.alpaca.markets'
-
-    # Create the Alpaca API client.
-    client = tradeapi.REST(
-        key_id=config.api_key,
-        secret_key=config.api_secret,
-        base_url=base_url,
-        api_version='v2')
+    # Get the Alpaca API client.
+    client = alpaca_client.get_client()
 
     # Get arguments.
     args = arguments()
 
     # Select a date.
-    tz = pytz.timezone('America/New_York')
     if args.date:
-        start_date = datetime.datetime.strptime(args.date, '%Y-%m-%d')
-        end_date = start_date + datetime.timedelta(days=1)
-        start_date = start_date.replace(tzinfo=tz)
-        end_date = end_date.replace(tzinfo=tz)
-        dates = [[start_date, end_date]]
-
+        dates = day_ranges(args.date, args.date)
     elif args.date_range:
-        date_range_start, date_range_end = args.date_range.split(' - ')
-        start_date = datetime.datetime.strptime(date_range_start, '%Y-%m-%d')
-        end_date = datetime.datetime.strptime(date_range_end, '%Y-%m-%d')
-        start_date = start_date.replace(tzinfo=tz)
-        end_date = end_date.replace(tzinfo=tz)
-
-        one_day = datetime.timedelta(days=1)
-        dates = [[start_date, start_date + one_day]]
-        for _ in range((end_date - start_date).days):
-            next_date = dates[-1][1] + one_day
-            dates.append([dates[-1][1], next_date])
+        dates = day_ranges(*args.date_range.split(' - '))
     else:
         #start_date = datetime.datetime(2020, 7, 28, tzinfo=tz)
         start_date = datetime.datetime.utcnow().date()
         end_date = (start_date + datetime.timedelta(days=1))
         dates = [[start_date, end_date]]
 
-    orders = []
-    for start_date, end_date in dates:
-        days_orders = client.list_orders(
-            limit=500,
-            after=start_date.isoformat(),
-            until=end_date.isoformat(),
-            status='all')
-        orders.extend([o._raw for o in days_orders])
-
-    print(orders)
-
-    # Save to file.
+    # Space out the API calls so long date ranges don't hit the rate limit
+    # and slow down further if the API starts throttling us.
+    bucket = rate_limiter.TokenBucket()
+    limiter = adaptive_pacer.ConcurrencyLimiter(
+        permits=FETCH_WORKERS, max_permits=FETCH_WORKERS, rate_limiter=bucket)
+    pacer = adaptive_pacer.AdaptivePacer(delay=0)
+
+    # Pull the days in parallel. The results are returned in the order
+    # of the dates and each day is written to file as soon as it arrives.
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        pages = fetch_days(
+            executor, lambda date: fetch_orders(client, limiter, pacer, *date), dates)
+        if args.output:
+            pages = to_csv(pages, args.output)
+        total = 0
+        for days_orders in pages:
+            total += len(days_orders)
+            if args.verbose:
+                print(days_orders)
+    print(f'Fetched {total} orders')
+
+    # Serve the file.
     if args.output:
-        to_csv(orders, args.output)
         serve(args.output)
 
 
@@ -1,5 +1,14 @@
+import time
+import random
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
+from python_http_client.exceptions import HTTPError
+
+# The retry delay in seconds is base * 2^attempt capped at BACKOFF_CAP
+# with up to BACKOFF_JITTER seconds of random jitter added on top.
+BACKOFF_BASE = 1
+BACKOFF_CAP = 30
+BACKOFF_JITTER = 1
 
 class EmailSender:
     '''
@@ -14,21 +23,24 @@ class EmailSender:
 
     def send(self, from_email, to_email, subject, message, retry=3):
         '''
-        Send email.
+        Send email. Failed attempts are retried with exponential backoff.
+        Only throttling (429) and server (5xx) errors are retried, other
+        HTTP errors are returned immediately.
 
         Arguments:
         from_email (str) : The sending email address.
         to_email (str) : The receiving email address.
         subject (str) : The subject line.
         message (str) : The body of the email.
+        retry (int) : The number of retries.
 
         Returns:
         On success: 'Email sent.'
         On error: The exception message.
         '''
         error = None
-        result = None
-        while retry >= 0:
+        for attempt in range(retry + 1):
+            delay = None
             try:
                 email_data = Mail(
                     from_email=from_email,
@@ -36,9 +48,35 @@ class EmailSender:
                     subject=subject,
                     html_content='<p>{}</p>'.format(message))
                 self.client.send(email_data)
-                result = 'Email sent.'
-                break
+                return 'Email sent.'
+            except HTTPError as ex:
+                error = ex
+                if ex.status_code != 429 and ex.status_code < 500:
+                    break
+                # The delay asked by the server is capped like the backoff.
+                delay = self._retry_after(ex)
+                if delay is not None:
+                    delay = min(BACKOFF_CAP, delay)
             except Exception as ex:
-                retry -= 1
                 error = ex
-        return result if result else error
+
+            if attempt < retry:
+                if delay is None:
+                    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+                    delay += random.uniform(0, BACKOFF_JITTER)
+                time.sleep(delay)
+        return error
+
+    def _retry_after(self, error):
+        '''
+        Get the number of seconds from the Retry-After header of
+        an HTTPError. Returns None if the header is missing or is
+        not numeric.
+        '''
+        headers = getattr(error, 'headers', None)
+        if not headers:
+            return None
+        try:
+            return float(headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
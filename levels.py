@@ -9,32 +9,23 @@ python3 levels.py my-levels.txt
 '''
 
 import sys
-import config
 import datetime
-import alpaca_trade_api as tradeapi
+import alpaca_client
+
+# The account items to drop from the received data.
+DROP_ITEMS = frozenset((
+    'account_number', 'status', 'trading_blocked',
+    'transfers_blocked', 'account_blocked', 'id',
+    'created_at', 'trade_suspended_by_user'))
 
 if __name__ == '__main__':
-    # Set the base url.
-    if config.use_sandbox:
-        base_url = 'https://paper-api.alpaca.markets'
-    else:
-        base_url = 'https://api.alpaca.markets'
-
-    # Create the Alpaca API client.
-    client = tradeapi.REST(
-        key_id=config.api_key,
-        secret_key=config.api_secret,
-        base_url=base_url,
-        api_version='v2')
+    # Get the Alpaca API client.
+    client = alpaca_client.get_client()
 
     # Get account data.
     account = client.get_account()._raw
 
-    # The list of items to drop from the received data.
-    drop_items = ('account_number', 'status', 'trading_blocked',
-                  'transfers_blocked', 'account_blocked', 'id',
-                  'created_at', 'trade_suspended_by_user')
-    data = [f'{k}: {v}' for k, v in account.items() if k not in drop_items]
+    data = [f'{k}: {v}' for k, v in account.items() if k not in DROP_ITEMS]
 
     # Prepare the string output.
     string_data = '\n'.join(data)
@@ -0,0 +1,88 @@
+'''
+Logging handlers shared by Trader and main.
+'''
+import os
+import time
+import logging
+import weakref
+import threading
+from logging.handlers import RotatingFileHandler
+
+# The size in bytes of the log file write buffer.
+LOG_BUFFER_SIZE = 65536
+
+# The number of seconds between flushes of the log file buffers.
+LOG_FLUSH_INTERVAL = 30
+
+# The log files are rotated when they reach LOG_MAX_BYTES and
+# LOG_BACKUP_COUNT old files are kept.
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# The log formats only use the time, thread name, logger name, level and
+# message, so skip collecting the process details and the caller's file
+# and line (which walks the stack) for every record. logThreads is kept
+# because the Trader log format uses the thread name.
+logging.logProcesses = False
+logging.logMultiprocessing = False
+logging._srcfile = None
+
+_buffered_handlers = weakref.WeakSet()
+_flusher_lock = threading.Lock()
+_flusher = None
+
+
+def _flush_periodically():
+    '''
+    Flush all buffered log files every LOG_FLUSH_INTERVAL seconds.
+    '''
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL)
+        for handler in list(_buffered_handlers):
+            handler.flush()
+
+
+class BufferedFileHandler(RotatingFileHandler):
+    '''
+    File handler which doesn't flush the file after each record.
+    Records are written to a LOG_BUFFER_SIZE buffer which is flushed
+    when it is full, when an ERROR or CRITICAL record is logged and
+    every LOG_FLUSH_INTERVAL seconds. The logging module flushes it
+    at exit. The file is rotated when it reaches LOG_MAX_BYTES.
+
+    Arguments:
+    filename (str) : The name of the log file.
+    '''
+    def __init__(self, filename):
+        super().__init__(
+            filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+
+        global _flusher
+        _buffered_handlers.add(self)
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(
+                    target=_flush_periodically, name='log_flusher', daemon=True)
+                _flusher.start()
+
+    def _open(self):
+        # The size is tracked while writing because checking it with
+        # seek() and tell() would flush the buffer on every record.
+        try:
+            self.size = os.path.getsize(self.baseFilename)
+        except OSError:
+            self.size = 0
+        return open(self.baseFilename, self.mode,
+                    buffering=LOG_BUFFER_SIZE, encoding=self.encoding)
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.size + len(msg) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(msg)
+            self.size += len(msg)
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except Exception:
+            self.handleError(record)
@@ -18,20 +18,30 @@ start <strategy name> - Start specific strategy if it is not running already.
 '''
 
 import sys
-import time
 import signal
 import config
 import pathlib
 import logging
-import importlib
+import functools
+import importlib.util
+import log_handlers
 import trader as tr
-from threading import Thread
+from threading import Thread, Event, stack_size
 
 # The strategy filename prefix is used for detecting multiple strategy files.
 STRATEGY_FILE_PREFIX = 'stock_'
 
-# The interval in seconds between starting Traders.
-TRADERS_START_INTERVAL = 2
+# The strategy files are looked up in the directory of this script.
+WORKING_DIRECTORY = pathlib.Path(__file__).parent
+
+# The module with the default strategy values imported by the strategy files.
+STRATEGY_DEFAULTS_MODULE = 'strategy'
+STRATEGY_DEFAULTS_FILE = WORKING_DIRECTORY / 'strategy.py'
+
+# The stack size in bytes of the Trader threads. The traders spend most
+# of the time sleeping between updates so they don't need the default
+# stack size of the platform (usually 8MB).
+TRADER_THREAD_STACK_SIZE = 512 * 1024
 
 
 class ServiceExit(Exception):
@@ -64,25 +74,52 @@ def construct_logger(name, log_file, level):
         formatter = logging.Formatter(log_format)
 
         # Add the console handler.
-        if config.console_log:
+        if config.get_settings().console_log:
             stream_handler = logging.StreamHandler()
             stream_handler.setFormatter(formatter)
             logger.addHandler(stream_handler)
 
         # Add the file handler.
-        file_handler = logging.FileHandler(log_file)
+        file_handler = log_handlers.BufferedFileHandler(log_file)
         file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
 
         return logger
 
-def construct_trader(strategy_file, config):
+@functools.lru_cache(maxsize=None)
+def load_strategy(strategy_file, mtime, defaults_mtime):
+    '''
+    Load a strategy module directly from its file instead of searching
+    for it on sys.path. The result is cached by file and modification
+    time (of the file and of the defaults in strategy.py) so an unchanged
+    strategy is executed only once while an edited one is loaded again.
+
+    Arguments:
+    strategy_file (Path): The strategy file.
+    mtime (float): The modification time of the strategy file.
+    defaults_mtime (float): The modification time of strategy.py.
+
+    Returns: module
+    '''
+    # Import the defaults again when the strategy file imports them so
+    # the edits made to strategy.py are used.
+    sys.modules.pop(STRATEGY_DEFAULTS_MODULE, None)
+
+    # The module name is the filename without the ".py" suffix.
+    module_name = strategy_file.stem
+    spec = importlib.util.spec_from_file_location(module_name, strategy_file)
+    strategy_module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = strategy_module
+    spec.loader.exec_module(strategy_module)
+    return strategy_module
+
+def construct_trader(strategy_file, settings):
     '''
     Creates a trader dict.
 
     Arguments:
     strategy_file (str): The name of the strategy file.
-    config (module): The config module.
+    settings (Settings): The configuration values.
 
     Returns:
     {
@@ -91,21 +128,18 @@ def construct_trader(strategy_file, config):
         'thread': Thread
     }
     '''
-    # Load the strategy module. We know that it will be a filename
-    # ending with ".py" so we can split it at this sequence and keep
-    # the first part.
-    module_name = strategy_file.name.split('.py')[0]
-    strategy_module = sys.modules.get(module_name)
-    if strategy_module:
-        importlib.reload(strategy_module)
-    else:
-        strategy_module = importlib.import_module(module_name)
+    # Load the strategy module.
+    module_name = strategy_file.stem
+    strategy_module = load_strategy(
+        strategy_file,
+        strategy_file.stat().st_mtime,
+        STRATEGY_DEFAULTS_FILE.stat().st_mtime)
 
     # Create a Trader.
     _trader = tr.Trader(
-        api_key=config.api_key,
-        api_secret=config.api_secret,
-        config=config,
+        api_key=settings.api_key,
+        api_secret=settings.api_secret,
+        config=settings,
         strategy=strategy_module)
 
     _trader.daemon = True
@@ -129,6 +163,39 @@ def register_signals():
     signal.signal(signal.SIGTERM, service_shutdown)
     signal.signal(signal.SIGINT, service_shutdown)
 
+# Set by the helper thread of wait_for_traders when all traders are terminated.
+_traders_done = Event()
+_traders_waiter = None
+
+def _join_traders(traders):
+    '''
+    Wait until all traders in the list are terminated, including the
+    ones added to the list while waiting.
+    '''
+    while True:
+        pending = [t for t in list(traders) if not t.done.is_set()]
+        if not pending:
+            _traders_done.set()
+            return
+        pending[0].done.wait()
+
+def wait_for_traders(traders):
+    '''
+    Block until all traders are terminated. The done events of the
+    traders are waited from a helper thread so the main thread can
+    still be interrupted by signals while waiting. The helper thread
+    is reused by the next call if it is interrupted, so the traders
+    list has to be updated in place.
+    '''
+    global _traders_waiter
+    while not all(t.done.is_set() for t in list(traders)):
+        # A new helper is only started after the previous one has returned.
+        if _traders_waiter is None or not _traders_waiter.is_alive():
+            _traders_done.clear()
+            _traders_waiter = Thread(target=_join_traders, args=(traders,), daemon=True)
+            _traders_waiter.start()
+        _traders_done.wait()
+
 def get_user_input():
     user_input = input('\n>>>')
     tokens = user_input.split(' ')
@@ -139,30 +206,32 @@ def main():
     register_signals()
 
     # Create the main threads logger.
-    log = construct_logger('main', config.log_file, config.log_level)
+    settings = config.get_settings()
+    log = construct_logger('main', settings.log_file, settings.log_level)
+
+    # Threads created from now on use the smaller stack size.
+    stack_size(TRADER_THREAD_STACK_SIZE)
 
     # Find all strategy files and create a Trader for each file.
     traders = []
-    working_directory = pathlib.Path(__file__).parent
-    strategy_files = working_directory.glob(f'{STRATEGY_FILE_PREFIX}*.py')
+    strategy_files = sorted(WORKING_DIRECTORY.glob(f'{STRATEGY_FILE_PREFIX}*.py'))
 
     for strategy_file in strategy_files:
-        traders.append(construct_trader(strategy_file, config))
+        traders.append(construct_trader(strategy_file, settings))
 
-    # Start traders one by one with interval between stars to avoid API overload.
+    # Start all traders at once. The API calls of the traders share a
+    # rate limiter so starting them together doesn't overload the API.
     for trader in traders:
-        log.info('Starting {}'.format(trader.name))
+        log.info('Starting %s', trader.name)
         trader.start()
-        time.sleep(TRADERS_START_INTERVAL)
 
-    # Each 5 seconds check if there are alive Threads.
+    # Wait until all Threads are terminated.
     # Threads can be terminated by the Trader raising SystemExit.
     while True:
         try:
-            if not any([t.is_alive() for t in traders]):
-                log.info('All threads are terminated.')
-                break
-            time.sleep(5)
+            wait_for_traders(traders)
+            log.info('All threads are terminated.')
+            break
 
         # ServiceExit will be raised on KeyboardInterrupt we will use this
         # as the user input terminal command.
@@ -183,14 +252,13 @@ def main():
                         trader.log.disabled = False
                         trader._shutdown_flag.set()
                         trader.join()
-                traders = [t for t in traders if t.is_alive()]
+                traders[:] = [t for t in traders if t.is_alive()]
 
             # Restart traders.
             if user_input['action'] == 'start':
-                working_directory = pathlib.Path(__file__).parent
-                strategy_file = working_directory / f'{user_input["target"]}.py'
+                strategy_file = WORKING_DIRECTORY / f'{user_input["target"]}.py'
                 if strategy_file.is_file():
-                    traders.append(construct_trader(strategy_file, config))
+                    traders.append(construct_trader(strategy_file, settings))
                     traders[-1].log.disabled = False
                     traders[-1].start()
 
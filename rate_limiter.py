@@ -0,0 +1,44 @@
+'''
+Client-side rate limiting for the Alpaca API.
+The API rate limit is 200 calls per minute, so by default the
+token bucket allows approximately 3 calls per second with short
+bursts of up to 5 calls.
+'''
+import time
+import threading
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket. Each API call takes one token and tokens
+    are refilled at a constant rate up to the bucket capacity.
+
+    Arguments:
+    rate (float) : The number of tokens added per second.
+    capacity (int) : The maximum number of tokens in the bucket.
+    '''
+    def __init__(self, rate=3, capacity=5):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Take a token from the bucket, sleeping until one is available.
+        '''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._last_refill
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                # The time until the next token is available.
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
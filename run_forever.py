@@ -1,22 +1,61 @@
 import sys
 import time
+import shlex
+import signal
 import traceback
-from subprocess import Popen
+from subprocess import Popen, TimeoutExpired
 
 python_command = sys.argv[1]
 filename = sys.argv[2]
 
 sleep_after_error = 10
 
-command = '{} {}'.format(python_command, filename)
+# The restart delay doubles with each consecutive failure up to this limit.
+max_sleep_after_error = 300
+
+# A run longer than this (in seconds) resets the restart delay.
+stable_run_time = 60
+
+# Run the script directly without starting a shell.
+args = shlex.split(python_command) + [filename]
+
+p = None
+
+def terminate(signum, frame):
+    '''
+    Stop the child process before exiting.
+    '''
+    if p is not None and p.poll() is None:
+        p.terminate()
+        try:
+            p.wait(5)
+        except TimeoutExpired:
+            p.kill()
+    sys.exit(0)
+
+signal.signal(signal.SIGTERM, terminate)
+
+consecutive_failures = 0
 
 while True:
+    started = time.monotonic()
     try:
         print(f'Starting {filename}')
-        p = Popen(command, shell=True)
+        p = Popen(args)
         p.wait()
-    except:
+    except Exception:
         err = traceback.format_exc()
         print(f'{filename} failed:\n{err}')
-        print(f'Restarting {filename} in {sleep_after_error} seconds.')
-        time.sleep(sleep_after_error)
+    else:
+        # A clean exit is restarted immediately.
+        if p.returncode == 0:
+            consecutive_failures = 0
+            continue
+        print(f'{filename} exited with code {p.returncode}.')
+
+    if time.monotonic() - started > stable_run_time:
+        consecutive_failures = 0
+    sleep = min(max_sleep_after_error, sleep_after_error * 2 ** consecutive_failures)
+    consecutive_failures += 1
+    print(f'Restarting {filename} in {sleep} seconds.')
+    time.sleep(sleep)
@@ -0,0 +1,78 @@
+'''
+Persistent log of the Trader state.
+Each placed order is recorded in a memory mapped file so a restarted
+Trader can resume tracking its last order instead of creating a new
+initial order. The file is a ring of fixed size records so writing a
+record doesn't rewrite the whole state.
+'''
+import os
+import mmap
+import time
+import struct
+
+# Record layout: sequence number, timestamp, order id and next order side.
+RECORD = struct.Struct('<Qd36s4s8x')
+
+# The number of records kept in the file.
+MAX_RECORDS = 64
+
+
+class StateLog:
+    '''
+    Ring of fixed size state records in a memory mapped file.
+
+    Arguments:
+    filename (str) : The name of the state file.
+    '''
+    def __init__(self, filename):
+        size = RECORD.size * MAX_RECORDS
+        mode = 'r+b' if os.path.exists(filename) else 'w+b'
+        self._file = open(filename, mode)
+        if os.fstat(self._file.fileno()).st_size != size:
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._seq = self._find_last()[0]
+
+    def _find_last(self):
+        '''
+        Returns: The (sequence, timestamp, order id, side) of the
+        latest record. The sequence is 0 if the log is empty.
+        '''
+        last = (0, 0, b'', b'')
+        for i in range(MAX_RECORDS):
+            record = RECORD.unpack_from(self._map, i * RECORD.size)
+            if record[0] > last[0]:
+                last = record
+        return last
+
+    def append(self, order_id, next_order_side):
+        '''
+        Record the last order id and the next order side.
+        '''
+        self._seq += 1
+        offset = (self._seq % MAX_RECORDS) * RECORD.size
+        RECORD.pack_into(
+            self._map, offset, self._seq, time.time(),
+            order_id.encode(), next_order_side.encode())
+
+    def last(self):
+        '''
+        Get the latest record.
+
+        Returns: Dict with last_order_id and next_order_side or None
+        if the log is empty.
+        '''
+        seq, _, order_id, side = self._find_last()
+        if not seq:
+            return None
+        return {
+            'last_order_id': order_id.rstrip(b'\0').decode(),
+            'next_order_side': side.rstrip(b'\0').decode()}
+
+    def clear(self):
+        '''
+        Remove all records.
+        '''
+        self._map[:] = bytes(len(self._map))
+        self._map.flush()
+        self._seq = 0
@@ -1,5 +1,7 @@
 '''
 Variables related to the strategy executed by Trader.
+These are the default values. The stock_* strategy files import
+them and override only the variables that differ.
 '''
 
 symbol = 'AAPL'
@@ -8,6 +10,9 @@ initial_order_side = 'sell'
 initial_order_type = 'limit'
 loop_order_type = 'limit'
 
+# Order instructions sent with each order or None.
+order_instructions = None
+
 # Use OCO for the initial order.
 oco_initial_order = True
 initial_oco_price = 239
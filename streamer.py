@@ -1,37 +1,127 @@
+import time
+import queue
+import random
 import config
 import zmq_msg
 import logging
+import threading
+import log_handlers
+import alpaca_client
 from alpaca_trade_api import StreamConn
 
+# The wait after a dropped connection is doubled for each consecutive
+# failure up to MAX_WAIT_AFTER_ERROR seconds.
 WAIT_AFTER_ERROR = 3
+MAX_WAIT_AFTER_ERROR = 60
 STRATEGY_FILE_PREFIX = 'stock_'
 
+# The number of recent orders fetched from the REST API when connecting.
+RECONCILE_ORDER_LIMIT = 100
+
+# The maximum number of order updates sent to the zmq server at once.
+WRITE_BATCH_SIZE = 128
+
+# The number of times a failed batch is sent again with a new zmq client.
+WRITE_RETRIES = 3
+
 def construct_logger(filename):
-    log_headers = [logging.FileHandler(filename), logging.StreamHandler()]
-    log_format = '%(asctime)s [%(levelname)s] %(message)s'
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=log_headers)
-    return logging.getLogger(__name__)
+    '''
+    Create the logger of this script. The handlers are added to a named
+    logger instead of the root logger so the records of the libraries
+    are not written to the log file, and only once if it is called again.
+    '''
+    logger = logging.getLogger(__name__)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+        for handler in (log_handlers.BufferedFileHandler(filename), logging.StreamHandler()):
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+    return logger
 
-if __name__ == '__main__':
-    log = construct_logger('streamer.log')
+def write_orders(orders):
+    '''
+    Send the order updates from the queue to the zmq server in batches.
+    The queue is unbounded because order updates must not be dropped.
+    A failed batch is sent again with a new zmq client (the request
+    socket can't be reused after a failed request) WRITE_RETRIES times
+    before it is dropped, so the thread keeps running.
+
+    Arguments:
+    orders (queue.Queue) : The order updates.
+    '''
     zmq = zmq_msg.Client()
+    while True:
+        batch = [orders.get()]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(orders.get_nowait())
+            except queue.Empty:
+                break
 
-    if config.use_sandbox:
-        base_url = 'https://paper-api.alpaca.markets'
-    else:
-        base_url = 'https://api.alpaca.markets'
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                zmq.write_batch(batch)
+                break
+            except Exception:
+                log.error('Writing %s orders to zmq failed.', len(batch), exc_info=True)
+                zmq.socket.close(linger=0)
+                zmq.context.term()
+                zmq = zmq_msg.Client()
+                if attempt < WRITE_RETRIES:
+                    time.sleep(WAIT_AFTER_ERROR)
+        else:
+            log.error('Dropped %s order updates.', len(batch))
+
+def reconcile_orders(orders):
+    '''
+    Put the most recent orders from the REST API in the queue so the
+    updates missed while the websocket was disconnected are not lost.
+    The orders are requested with their nested legs because they replace
+    the stored orders and the Traders check the legs of OCO orders.
+
+    Arguments:
+    orders (queue.Queue) : The order updates.
+    '''
+    client = alpaca_client.get_client()
+    params = {'status': 'all', 'limit': RECONCILE_ORDER_LIMIT, 'nested': 'true'}
+    for order in client.get('/orders', params):
+        orders.put_nowait(order)
+
+if __name__ == '__main__':
+    log = construct_logger('streamer.log')
+    orders = queue.Queue()
+    threading.Thread(
+        target=write_orders, args=(orders,), name='zmq_writer', daemon=True).start()
+    settings = config.get_settings()
 
     conn = StreamConn(
-        key_id=config.api_key,
-        secret_key=config.api_secret,
-        base_url=base_url)
+        key_id=settings.api_key,
+        secret_key=settings.api_secret,
+        base_url=alpaca_client.get_base_url(settings.use_sandbox))
 
     @conn.on(r'^trade_updates$')
     async def on_account_updates(conn, channel, account):
-        log.info(account.order)
-        zmq.write(account.order)
+        # Don't block the websocket loop with the zmq request.
+        log.info('%s', account.order)
+        orders.put_nowait(account.order)
+
+    # Reconnect when the connection drops. The orders are reconciled with
+    # the REST API before each connection.
+    failures = 0
+    while True:
+        started = time.monotonic()
+        try:
+            reconcile_orders(orders)
+            conn.run(['trade_updates'])
+        except Exception:
+            log.error('Streaming failed.', exc_info=True)
 
-    conn.run(['trade_updates'])
+        if time.monotonic() - started > MAX_WAIT_AFTER_ERROR:
+            failures = 0
+        wait = min(MAX_WAIT_AFTER_ERROR, WAIT_AFTER_ERROR * 2 ** failures)
+        failures = min(failures + 1, 10)
+        wait = random.uniform(wait / 2, wait)
+        log.info('Reconnecting in %.1f seconds.', wait)
+        time.sleep(wait)
@@ -5,16 +5,165 @@ https://docs.alpaca.markets/api-documentation/api-v2/
 https://github.com/alpacahq/alpaca-trade-api-python
 '''
 import time
-import uuid
+import queue
+import random
+import secrets
+import hashlib
+import itertools
+import datetime
+import atexit
+import types
 import signal
 import zmq_msg
 import logging
-import traceback
+import state_log
 import threading
 import email_sender
-import alpaca_trade_api as tradeapi
+import log_handlers
+import rate_limiter
+import alpaca_client
+import adaptive_pacer
+from requests.exceptions import HTTPError, Timeout
+from requests.exceptions import ConnectionError as RequestsConnectionError
 from alpaca_trade_api.rest import APIError as APIError
 from alpaca_trade_api.entity import Order as alpaca_order
+from logging.handlers import QueueHandler, QueueListener
+
+# The REST API calls of all Traders are rate limited together.
+API_RATE_LIMITER = rate_limiter.TokenBucket()
+
+# All Traders share the limit of concurrent API calls so they back off
+# together when the API is throttling.
+API_LIMITER = adaptive_pacer.ConcurrencyLimiter(rate_limiter=API_RATE_LIMITER)
+
+# The number of seconds between REST API checks of an order which
+# is not in a final state according to the streaming API.
+ORDER_RECONCILE_INTERVAL = 60
+
+# The delay in seconds before the first status check of a new order.
+# The delay is doubled while the order status doesn't change up to
+# the update_time.
+INITIAL_POLL_GAP = 0.25
+
+# The error delay stops doubling after this many consecutive errors.
+MAX_ERROR_DOUBLINGS = 16
+
+# The number of seconds the market clock is cached.
+CLOCK_TTL = 60
+
+# The number of seconds to wait for the orders to be canceled on termination.
+CANCEL_TIMEOUT = 5
+
+# The maximum number of status emails waiting to be sent.
+EMAIL_QUEUE_SIZE = 100
+
+# The number of seconds to wait for the queued emails to be sent on termination.
+EMAIL_FLUSH_TIMEOUT = 10
+
+# The client order id prefixes used by Trader.
+ORDER_ID_PREFIXES = frozenset(['initial', 'loop'])
+
+# Random token that makes the client order ids of this process unique
+# together with the order counter.
+ORDER_ID_TOKEN = secrets.token_hex(4)
+
+# Alpaca accepts client order ids of up to 48 characters. The ids are
+# '<prefix>-<8 hex digit counter>-<token>', so a longer prefix is caught here.
+MAX_ORDER_ID_LENGTH = 48
+assert max(map(len, ORDER_ID_PREFIXES)) + 10 + len(ORDER_ID_TOKEN) <= MAX_ORDER_ID_LENGTH
+
+# The initial order prices of each order type as
+# (buy limit, buy stop, sell limit, sell stop).
+INITIAL_PRICES = {
+    'market': lambda s: (None, None, None, None),
+    'limit': lambda s: (
+        s.initial_trade_price, None,
+        s.initial_trade_price, None),
+    'stop': lambda s: (
+        None, s.initial_trade_price,
+        None, s.initial_trade_price),
+    'stop_limit': lambda s: (
+        s.initial_trade_price + s.initial_limit_spread, s.initial_trade_price,
+        s.initial_trade_price - s.initial_limit_spread, s.initial_trade_price)}
+
+# The loop and jump order prices of each order type as
+# (buy limit, buy stop, sell limit, sell stop) for the loop order
+# followed by the same four prices for the jump order.
+# We can't have market loop orders.
+LOOP_PRICES = {
+    'limit': lambda s: (
+        s.loop_signal_price + s.loop_trade_spread + s.loop_limit_spread, None,
+        s.loop_signal_price - s.loop_trade_spread - s.loop_limit_spread, None,
+        s.loop_signal_price + s.jump_loop_order + s.jump_limit_spread, None,
+        s.loop_signal_price - s.jump_loop_order - s.jump_limit_spread, None),
+    'stop': lambda s: (
+        None, s.loop_signal_price + s.loop_trade_spread,
+        None, s.loop_signal_price - s.loop_trade_spread,
+        None, s.loop_signal_price + s.jump_loop_order,
+        None, s.loop_signal_price - s.jump_loop_order),
+    'stop_limit': lambda s: (
+        s.loop_signal_price + s.loop_trade_spread + s.loop_limit_spread,
+        s.loop_signal_price + s.loop_trade_spread,
+        s.loop_signal_price - s.loop_trade_spread - s.loop_limit_spread,
+        s.loop_signal_price - s.loop_trade_spread,
+        s.loop_signal_price + s.jump_loop_order + s.jump_limit_spread,
+        s.loop_signal_price + s.jump_loop_order,
+        s.loop_signal_price - s.jump_loop_order - s.jump_limit_spread,
+        s.loop_signal_price - s.jump_loop_order)}
+
+# The OCO order prices don't depend on the order types.
+OCO_PRICES = lambda s: {
+    # Initial OCO order.
+    'oco_initial_buy_limit_price': s.initial_oco_price - s.initial_limit_spread,
+    'oco_initial_sell_limit_price': s.initial_oco_price + s.initial_limit_spread,
+    'oco_initial_buy_stop_price': s.initial_oco_price,
+    'oco_initial_sell_stop_price': s.initial_oco_price,
+    # Loop OCO orders.
+    'oco_buy_limit_price': s.oco_limit_price,
+    'oco_sell_limit_price': s.oco_limit_price,
+    'oco_buy_stop_price': s.loop_signal_price + s.loop_trade_spread,
+    'oco_sell_stop_price': s.loop_signal_price - s.loop_trade_spread,
+    # Jump OCO orders.
+    'oco_jump_buy_limit_price': s.oco_limit_price + s.jump_loop_order + s.jump_limit_spread,
+    'oco_jump_sell_limit_price': s.oco_limit_price + s.jump_loop_order + s.jump_limit_spread,
+    'oco_jump_buy_stop_price': s.loop_signal_price - s.jump_loop_order,
+    'oco_jump_sell_stop_price': s.loop_signal_price - s.jump_loop_order}
+
+# Order statuses that don't change anymore.
+FINAL_ORDER_STATUSES = frozenset(['filled', 'canceled', 'expired', 'rejected'])
+
+# Errors of failed REST API calls.
+REQUEST_ERRORS = (APIError, HTTPError, RequestsConnectionError, Timeout)
+
+# Thread names match strategy names so we can use it in the formatting.
+LOG_FORMAT = '%(asctime)s [%(threadName)s] [%(levelname)s] %(message)s'
+LOG_FORMATTER = logging.Formatter(LOG_FORMAT)
+
+# All strategy loggers share the same console handler.
+CONSOLE_HANDLER = logging.StreamHandler()
+CONSOLE_HANDLER.setFormatter(LOG_FORMATTER)
+
+# The strategy loggers only put their records in a queue. A single listener
+# thread takes them from the queue and writes them to the console and files.
+LOG_QUEUE = queue.Queue(-1)
+LOG_QUEUE_HANDLER = QueueHandler(LOG_QUEUE)
+LOG_LISTENER = QueueListener(LOG_QUEUE, respect_handler_level=True)
+_log_listener_lock = threading.Lock()
+
+
+def add_log_handler(handler):
+    '''
+    Add a handler to the log listener. The listener is started when
+    the first handler is added and stopped (after writing all queued
+    records) at exit.
+    '''
+    with _log_listener_lock:
+        if handler in LOG_LISTENER.handlers:
+            return
+        if not LOG_LISTENER.handlers:
+            LOG_LISTENER.start()
+            atexit.register(LOG_LISTENER.stop)
+        LOG_LISTENER.handlers += (handler,)
 
 
 class OrderRejectedError(Exception):
@@ -24,6 +173,14 @@ class OrderRejectedError(Exception):
     pass
 
 
+class OrderNotFoundError(Exception):
+    '''
+    This exception is raised when the tracked order doesn't exist in the
+    account, e.g. it was resumed from the state of another account.
+    '''
+    pass
+
+
 class Trader(threading.Thread):
     '''
     The trander handles communication with the Alpaca API.
@@ -31,9 +188,26 @@ class Trader(threading.Thread):
     Arguments:
     api_key (str) : The api key.
     api_secret (str) : The api secret.
-    config (module) : The config module.
+    config (Settings) : The configuration values, see config.get_settings.
     strategy (module) : The strategy module.
     '''
+    # The side map is used for order side switching.
+    _SIDE_MAP = types.MappingProxyType({'buy': 'sell', 'sell': 'buy'})
+
+    # Counts the orders of all Traders in this process.
+    _order_counter = itertools.count()
+
+    # The email message templates.
+    _STATUS_EMAIL = '''
+            Open Position: {position_size} {position_symbol} <br>
+            Active Order: {side} {quantity} {symbol} {price} <br>
+            Order Status: {status}
+            '''
+    _TERMINATION_EMAIL = '''
+        The system has terminated.<br>
+        Reason: {reason}
+        '''
+
     def __init__(self, api_key, api_secret, config, strategy):
         # Trader is runnable as a thread so we need to set it up
         # accordingly. If it has to be terminated from the parrent
@@ -42,6 +216,9 @@ class Trader(threading.Thread):
         threading.Thread.__init__(self)
         self._shutdown_flag = threading.Event()
 
+        # Set when the trader stops running for any reason.
+        self.done = threading.Event()
+
         # All state related variables will be tracked in the state dict.
         # Don't initiate any keys here because the _loop function detects if
         # it is running for the first time by checking its truth value.
@@ -57,37 +234,86 @@ class Trader(threading.Thread):
         # Trader supports single symbol at this point.
         self.symbol = self.strategy.symbol
 
+        # The loop order parameters depend only on the strategy.
+        self._build_order_templates()
+
+        # Strategy values read on every update.
+        self.enable_email_monitoring = self.strategy.enable_email_monitoring
+        self.order_instructions = self.strategy.order_instructions
+        self.loop_limit_prices = {
+            'buy': self.strategy.loop_buy_limit_price,
+            'sell': self.strategy.loop_sell_limit_price}
+
+        # The email_monitoring_frequency is in minutes, convert it to seconds.
+        self.email_monitoring_interval = self.strategy.email_monitoring_frequency * 60
+
         self.update_time = self.config.update_time
         self.sleep_after_error = self.config.sleep_after_error
+        self.max_sleep_after_error = self.config.max_sleep_after_error
+
+        # The poll gap grows from the initial gap to update_time, so it
+        # can't start above an update_time shorter than INITIAL_POLL_GAP.
+        self.initial_poll_gap = min(INITIAL_POLL_GAP, self.update_time)
+
+        # The number of consecutive failed updates.
+        self.error_count = 0
+
+        # The delay between updates is adjusted to the API load.
+        self.pacer = adaptive_pacer.AdaptivePacer(
+            delay=self.update_time,
+            max_delay=self.config.max_update_time)
 
         # The number of retries if the order creation fails.
         self.retry_order_creation = self.config.retry_order_creation
 
         self.order_status_check_delay = self.config.order_status_check_delay
 
-        # Set the base url.
-        if self.config.use_sandbox:
-            base_url = 'https://paper-api.alpaca.markets'
-        else:
-            base_url = 'https://api.alpaca.markets'
-
-        # Create the Alpaca API client.
-        self.client = tradeapi.REST(
-            key_id=api_key,
-            secret_key=api_secret,
-            base_url=base_url,
-            api_version='v2')
+        # All Traders with the same credentials share the Alpaca API client
+        # so the API calls reuse the same keep-alive connections.
+        self.client = alpaca_client.get_shared_client(
+            api_key, api_secret, self.config.use_sandbox)
+        alpaca_client.keep_alive(self.client)
 
         # Setup logging.
         self.log = self.construct_logger()
 
         # Setup email sending.
-        if strategy.enable_email_monitoring:
+        if self.enable_email_monitoring:
             # Set the last_email_timestamp to current time.
             self.last_email_timestamp = time.time()
             self.email_sender = email_sender.EmailSender(self.config.sendgrid_api_key)
+            # The status emails are sent by a background thread, see run.
+            self.email_queue = queue.Queue(EMAIL_QUEUE_SIZE)
+            self.email_thread = None
 
         self.zmq_client = zmq_msg.Client()
+        self.order_updates = zmq_msg.Subscriber()
+
+        # The last order as pushed by the streamer while waiting for the update.
+        self.pushed_order = None
+
+        # The parameters of the initial order until it is created.
+        self.initial_order_parameters = None
+
+        # Resume tracking the last order if the Trader was stopped
+        # without terminating, e.g. the process crashed.
+        # The state file is kept per account (a hash of the api key) and
+        # per API, so a saved order is only resumed where it exists.
+        account = hashlib.sha256(api_key.encode()).hexdigest()[:8]
+        environment = 'paper' if self.config.use_sandbox else 'live'
+        self.state_log = state_log.StateLog('{}_{}_{}_state.log'.format(
+            self.strategy.__name__, environment, account))
+        saved_state = self.state_log.last()
+        if saved_state:
+            self.log.info('Resuming from order %s.', saved_state['last_order_id'])
+            self.state.update(saved_state, last_order_status=None, poll_gap=self.initial_poll_gap)
+
+        # The cached market clock, the time it was fetched and its
+        # next_open as a timestamp.
+        self.clock = None
+        self.clock_time = 0
+        self.next_open = None
+        self.last_order_reconcile = time.monotonic()
 
     def construct_logger(self):
         '''
@@ -105,21 +331,19 @@ class Trader(threading.Thread):
         log_level = getattr(logging, self.config.log_level)
         logger.setLevel(log_level)
 
-        # Thread names match strategy names so we can use it in the formatting.
-        log_format = '%(asctime)s [%(threadName)s] [%(levelname)s] %(message)s'
-        formatter = logging.Formatter(log_format)
-
-        # Add the console handler.
         if not logger.handlers:
+            logger.addHandler(LOG_QUEUE_HANDLER)
+
+            # Add the console handler.
             if self.config.console_log:
-                stream_handler = logging.StreamHandler()
-                stream_handler.setFormatter(formatter)
-                logger.addHandler(stream_handler)
+                add_log_handler(CONSOLE_HANDLER)
 
-            # Add the file handler.
-            file_handler = logging.FileHandler(log_file)
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            # Add the file handler. The listener passes it the records of
+            # all strategies so it only keeps the ones of this logger.
+            file_handler = log_handlers.BufferedFileHandler(log_file)
+            file_handler.setFormatter(LOG_FORMATTER)
+            file_handler.addFilter(logging.Filter(name))
+            add_log_handler(file_handler)
 
         return logger
 
@@ -129,8 +353,8 @@ class Trader(threading.Thread):
         If there is no position we will get APIError and will return None
         '''
         try:
-            position = self.client.get_position(self.symbol)
-            self.log.debug('Fetched position: {}'.format(position._raw))
+            position = API_LIMITER.call(self.client.get_position, self.symbol)
+            self.log.debug('Fetched position: %s', position._raw)
             return position._raw
         except APIError:
             return None
@@ -146,11 +370,63 @@ class Trader(threading.Thread):
             'timestamp': '2019-12-28T19:48:41.067338957-05:00'
         }
         '''
-        clock = self.client.get_clock()
+        clock = API_LIMITER.call(self.client.get_clock)
         return clock._raw
 
+    def get_cached_clock(self):
+        '''
+        Get the market clock, fetching it at most once per CLOCK_TTL seconds.
+        The next_open time is parsed once per fetch.
+        Returns (dict): See get_clock.
+        '''
+        now = time.monotonic()
+        if self.clock is None or now - self.clock_time > CLOCK_TTL:
+            self.clock = self.get_clock()
+            self.clock_time = now
+            self.next_open = datetime.datetime.fromisoformat(
+                self.clock['next_open']).timestamp()
+        return self.clock
+
+    def _wait_for_market_open(self, clock):
+        '''
+        Sleep until the next market open or until the Trader is terminated.
+        The clock is fetched again after the wait.
+
+        Arguments:
+        clock (dict) : The market clock.
+        '''
+        delay = max(self.next_open - time.time(), self.update_time)
+        self.log.info('The market is closed. Waiting until %s.', clock['next_open'])
+        self._shutdown_flag.wait(delay)
+        self.clock = None
+
     def run(self):
-        self.run_forever()
+        # The email thread is started here because the Trader is named after
+        # it's created and the thread has the same name for the log format.
+        if self.enable_email_monitoring and self.email_thread is None:
+            self.email_thread = threading.Thread(
+                target=self._send_queued_emails, name=self.name, daemon=True)
+            self.email_thread.start()
+        try:
+            self.run_forever()
+        finally:
+            self.done.set()
+
+    def _send_queued_emails(self):
+        '''
+        Send the queued emails so a slow email API doesn't delay the
+        trading loop or the termination. Stops when it gets None from
+        the queue.
+        '''
+        while True:
+            email = self.email_queue.get()
+            if email is None:
+                return
+            result = self.email_sender.send(**email)
+            if result != 'Email sent.':
+                self.log.warning('Sending %s email failed: %s', email['subject'], result)
+            else:
+                self.log.info('%s email sent.', email['subject'])
 
     def run_forever(self):
         '''
@@ -158,42 +434,81 @@ class Trader(threading.Thread):
         '''
 
         # Report if the market is open or closed.
-        market_state = 'open' if self.get_clock()['is_open'] else 'closed'
-        self.log.info('Starting Trader. The market is {}.'.format(market_state))
+        market_state = 'open' if self.get_cached_clock()['is_open'] else 'closed'
+        self.log.info('Starting Trader. The market is %s.', market_state)
 
         # Run forever.
         while True:
             try:
                 self._signals()
+
+                # The orders can't be filled while the market is closed and
+                # the loop only acts on fills, so it waits until the open.
+                if self.state:
+                    clock = self.get_cached_clock()
+                    if not clock['is_open']:
+                        self._wait_for_market_open(clock)
+                        continue
+
                 self._loop()
-                time.sleep(self.update_time)
+                self.error_count = 0
+                self.pacer.report()
+
+                # Sleep until the next update or until the streamer
+                # pushes a change of the last order.
+                self.pushed_order = self.order_updates.wait(
+                    self.pacer.get_delay(self.state.get('poll_gap')),
+                    self.state.get('last_order_id'))
             # Creating of new order failed.
             except OrderRejectedError:
                 if self.retry_order_creation > 0:
                     self.retry_order_creation -= 1
                     # By clearing the state dict we restart the strategy.
                     self.state = {}
+                    delay = self._error_delay()
                     self.log.warning(
-                        'Order creation failed. Retying in {} seconds.'.format(
-                            self.sleep_after_error))
-                    time.sleep(self.sleep_after_error)
+                        'Order creation failed. Retying in %.1f seconds.', delay)
+                    time.sleep(delay)
                 else:
                     termination_reason = 'Max order creation retries reached.'
-                    if self.strategy.enable_email_monitoring:
-                        response = self._send_termination_alert(reason=termination_reason)
-                        self.log.info(response)
-                    self._terminate(reason=termination_reason)
+                    self._terminate(reason=termination_reason, alert=True)
+            # The tracked order can't be followed anymore.
+            except OrderNotFoundError as err:
+                self._terminate(reason=str(err), alert=True)
             # Kayboard interupts can terminate the run.
             except KeyboardInterrupt:
                 self._terminate(reason='User interruption.')
-            # Explicit system exit.
-            except SystemExit:
-                raise SystemExit
+            # API errors slow down the updates if the API is throttling us.
+            # Client errors (e.g. invalid credentials) won't be fixed by
+            # retrying so they terminate the Trader.
+            except (APIError, HTTPError) as err:
+                status = adaptive_pacer.status_code(err)
+                if status is not None and not adaptive_pacer.is_backoff_status(status):
+                    termination_reason = 'Unrecoverable API error ({}): {}'.format(status, err)
+                    self.log.error(termination_reason, exc_info=True)
+                    self._terminate(reason=termination_reason, alert=True)
+                self.pacer.report(err)
+                self.log.warning('API error in the main loop: %s', err)
+                time.sleep(self._error_delay())
             # Any other error will be ignored.
-            except:
-                self.log.warning('The main loop failed. {}'.format(
-                    traceback.format_exc()))
-                time.sleep(self.sleep_after_error)
+            except Exception:
+                self.log.warning('The main loop failed.', exc_info=True)
+                time.sleep(self._error_delay())
+
+    def _error_delay(self):
+        '''
+        Get the number of seconds to wait after a failed update.
+        The delay is a random value up to sleep_after_error doubled for
+        each consecutive error and capped at max_sleep_after_error.
+
+        Returns: float
+        '''
+        # The exponent is clamped so the value can't overflow even when the
+        # cap is never reached, e.g. with a sleep_after_error of 0.
+        backoff = self.sleep_after_error * 2 ** min(self.error_count, MAX_ERROR_DOUBLINGS)
+        if backoff < self.max_sleep_after_error:
+            self.error_count += 1
+        return random.uniform(0, min(self.max_sleep_after_error, backoff))
 
     def submit_order(self, parameters):
         '''
@@ -207,20 +522,55 @@ class Trader(threading.Thread):
 
         Returns: Dict on success and None on error.
         '''
+        # The nested take_profit and stop_loss dicts are shared with the order
+        # templates and the submit functions convert their prices in place.
+        parameters = {k: dict(v) if isinstance(v, dict) else v for k, v in parameters.items()}
         try:
-            if self.strategy.order_instructions:
-                order = self._submit_order_with_instructions(**parameters)
+            if self.order_instructions:
+                order = API_LIMITER.call(
+                    self._submit_order_with_instructions, **parameters)
             else:
-                order = self.client.submit_order(**parameters)
-            self.log.debug('Created order: {}'.format(order._raw))
+                order = API_LIMITER.call(self.client.submit_order, **parameters)
+            self.log.debug('Created order: %s', order._raw)
             return order._raw
         except APIError as err:
-            self.log.error('API error during order creation: {}'.format(err._error))
+            self.log.error('API error during order creation: %s', err._error)
+            return None
+        except REQUEST_ERRORS as err:
+            # The order may have been created even though the response was lost,
+            # e.g. on a timeout or a gateway error.
+            self.log.error('Request error during order creation: %s', err)
             return None
 
+    def find_order(self, client_order_id):
+        '''
+        Get an order by its client order id.
+
+        Arguments:
+        client_order_id (str) : The client order id.
+
+        Returns: Dict or None if there is no such order.
+        '''
+        try:
+            order = API_LIMITER.call(
+                self.client.get, '/orders:by_client_order_id',
+                {'client_order_id': client_order_id})
+        except APIError as err:
+            if adaptive_pacer.status_code(err) == 404:
+                return None
+            raise
+        self.log.debug('Fetched order: %s', order)
+        return order
+
     def get_order(self, order_id, streaming=True):
         '''
         Get an order by its ID.
+        The streamed order is reconciled with the REST API every
+        ORDER_RECONCILE_INTERVAL seconds until it reaches a final state
+        in case the streamer missed an update. The order is requested
+        from the REST API with the legs of OCO orders nested in it.
+        If the reconcile fails the streamed order is used, unless the
+        order doesn't exist (404) which raises OrderNotFoundError.
 
         Arguments:
         order_id (str) : The order id.
@@ -228,18 +578,29 @@ class Trader(threading.Thread):
         Returns: Dict
         '''
         if streaming:
-            response = self.zmq_client.read()
+            response = self.zmq_client.read(order_id)
             order = response['orders'].get(order_id)
-            self.log.debug('Fetched order: {}'.format(order))
+            self.log.debug('Fetched order: %s', order)
+            if not order or order['status'] not in FINAL_ORDER_STATUSES:
+                now = time.monotonic()
+                if now - self.last_order_reconcile >= ORDER_RECONCILE_INTERVAL:
+                    self.last_order_reconcile = now
+                    try:
+                        return self.get_order(order_id, streaming=False)
+                    except REQUEST_ERRORS as err:
+                        if adaptive_pacer.status_code(err) == 404:
+                            raise OrderNotFoundError('Order {} was not found.'.format(order_id))
+                        self.log.warning('Reconciling order %s failed: %s', order_id, err)
             if not order:
                 # New orders doesn't show in the streaming API
                 # so we will assume that the order status is "new"
                 return {'status': 'new', 'id': order_id}
             return order
 
-        order = self.client.get_order(order_id)
-        self.log.debug('Fetched order: {}'.format(order._raw))
-        return order._raw
+        order = API_LIMITER.call(
+            self.client.get, '/orders/{}'.format(order_id), {'nested': 'true'})
+        self.log.debug('Fetched order: %s', order)
+        return order
 
     def order_is_oco(self, order):
         return order.get('legs')
@@ -260,11 +621,11 @@ class Trader(threading.Thread):
             if not orders:
                 return []
             orders = [o for o in orders.values() if o['status'] == status]
-            self.log.debug('Fetched orders: {}'.format(orders))
+            self.log.debug('Fetched orders: %s', orders)
             return orders
 
-        orders = self.client.list_orders(status=status)
-        self.log.debug('Fetched orders: {}'.format(orders))
+        orders = API_LIMITER.call(self.client.list_orders, status=status)
+        self.log.debug('Fetched orders: %s', orders)
         return orders
 
     def get_account(self):
@@ -290,20 +651,19 @@ class Trader(threading.Thread):
         "change_today": "0.0084"
         }
         '''
-        account = self.client.get_account()
-        self.log.debug('Fetched account: {}'.format(account._raw))
+        account = API_LIMITER.call(self.client.get_account)
+        self.log.debug('Fetched account: %s', account._raw)
         return account._raw
 
     def cancel_symbol_orders(self):
         '''
         Cancel all orders for the traded symbol.
         '''
-        skip_statusses = ['canceled', 'filled']
         open_orders = self.get_orders(streaming=False)
         for order in open_orders:
             if order.symbol == self.symbol \
-            and order.status not in skip_statusses:
-                self.client.cancel_order(order.id)
+            and order.status not in FINAL_ORDER_STATUSES:
+                API_LIMITER.call(self.client.cancel_order, order.id)
 
     def oco_filled(self, order, leg):
         '''
@@ -338,282 +698,272 @@ class Trader(threading.Thread):
         '''
         # Executed only at the initial run.
         if not self.state:
-            # The side map will be used for order side switching.
-            self.state['side_map'] = {'buy': 'sell', 'sell': 'buy'}
             initial_order_side = self.strategy.initial_order_side
 
-            # Check which set of order prices we should use.
-            if initial_order_side == 'buy':
-                if self.strategy.oco_initial_order:
-                    limit_price = self.strategy.oco_initial_buy_limit_price
-                    stop_price = self.strategy.oco_initial_buy_stop_price
-                else:
-                    limit_price = self.strategy.initial_buy_limit_price
-                    stop_price = self.strategy.initial_buy_stop_price
-            elif initial_order_side == 'sell':
-                if self.strategy.oco_initial_order:
-                    limit_price = self.strategy.oco_initial_sell_limit_price
-                    stop_price = self.strategy.oco_initial_sell_stop_price
-                else:
-                    limit_price = self.strategy.initial_sell_limit_price
-                    stop_price = self.strategy.initial_sell_stop_price
-
-            # Generate the order parameters.
-            if self.strategy.oco_initial_order:
-                order_parameters = {
-                    'symbol': self.symbol,
-                    'qty': self.strategy.quantity,
-                    'side': initial_order_side,
-                    'type': 'limit',
-                    'time_in_force': self.strategy.time_in_force,
-                    'order_class': 'oco',
-                    'take_profit': {'limit_price': limit_price},
-                    'stop_loss': {'stop_price': stop_price},
-                    'client_order_id': self._generate_order_id('initial')}
-            else:
-                order_parameters = {
-                    'symbol': self.symbol,
-                    'qty': self.strategy.quantity,
-                    'side': initial_order_side,
-                    'type': self.strategy.initial_order_type,
-                    'time_in_force': self.strategy.time_in_force,
-                    'limit_price': limit_price,
-                    'stop_price': stop_price,
-                    'client_order_id' : self._generate_order_id('initial')}
+            # A failed initial order is submitted again with the same client
+            # order id so it can't be duplicated if it was created anyway.
+            order_parameters = self.initial_order_parameters
+            if order_parameters is None:
+                order_parameters = self._order_parameters('initial', initial_order_side)
+                self.initial_order_parameters = order_parameters
 
             # Create the first order.
-            self.log.info('Created initial order: {}'.format(order_parameters))
+            self.log.info('Created initial order: %s', order_parameters)
             order = self.submit_order(order_parameters)
+            if not order:
+                try:
+                    order = self.find_order(order_parameters['client_order_id'])
+                except REQUEST_ERRORS as err:
+                    self.log.warning('Looking up the initial order failed: %s', err)
+                if order:
+                    self.log.info('The initial order was created despite the error.')
 
             # Any error during order submission will be treated as order rejection and
             # will raise OrderRejectedError that is handled by the run_forever method.
             if not order:
                 raise OrderRejectedError('Creating order failed.')
             else:
+                self.initial_order_parameters = None
                 self.retry_order_creation = self.config.retry_order_creation
 
-            self.log.info('Order status: {}'.format(order['status']))
-
-            # Keep track of the order id and next order side.
-            self.state['last_order_id'] = order['id']
-            self.state['next_order_side'] = self.state['side_map'][initial_order_side]
+            self._track_order(order, initial_order_side)
 
         # Executed on each update after the initial run.
         else:
-            # Get the order data of the last order.
+            # Get the order data of the last order. Use the pushed order if
+            # the streamer sent one, otherwise request it.
             last_order_id = self.state['last_order_id']
-            last_order = self.get_order(last_order_id)
+            last_order = self.pushed_order
+            self.pushed_order = None
+            if last_order is None or last_order['id'] != last_order_id:
+                last_order = self.get_order(last_order_id)
+
+            # Check the order often after its status changes and less often
+            # while it stays the same.
+            if last_order['status'] == self.state['last_order_status']:
+                self.state['poll_gap'] = min(self.state['poll_gap'] * 2, self.update_time)
+            else:
+                self.state['last_order_status'] = last_order['status']
+                self.state['poll_gap'] = self.initial_poll_gap
 
             # Send email if monitoring is enabled.
-            self._send_status_email(last_order)
+            if self.enable_email_monitoring:
+                self._send_status_email(last_order, time.time())
 
             # Terminate if running in OCO mode and the take profit order is filled.
             if self.oco_filled(last_order, leg='take_profit'):
                 reason = 'Take profit OCO order filled.'
-                self._send_termination_alert(reason=reason)
-                self._terminate(reason=reason)
+                self._terminate(reason=reason, alert=True)
 
             # If the order is filled we will place new one.
             if last_order['status'] == 'filled' or self.oco_filled(last_order, leg='stop_loss'):
                 # Log the order data.
                 self._log_order_status(last_order)
 
-                # Check which set of order prices we should use.
-                if self.state['next_order_side'] == 'buy':
-                    limit_price = self.strategy.loop_buy_limit_price
-                    stop_price = self.strategy.loop_buy_stop_price
-                    jump_limit_price = self.strategy.jump_buy_limit_price
-                    jump_stop_price = self.strategy.jump_buy_stop_price
-                    oco_jump_limit_price = self.strategy.oco_jump_buy_limit_price
-                    oco_jump_stop_price = self.strategy.oco_jump_buy_stop_price
-                elif self.state['next_order_side'] == 'sell':
-                    limit_price = self.strategy.loop_sell_limit_price
-                    stop_price = self.strategy.loop_sell_stop_price
-                    jump_limit_price = self.strategy.jump_sell_limit_price
-                    jump_stop_price = self.strategy.jump_sell_stop_price
-                    oco_jump_limit_price = self.strategy.oco_jump_sell_limit_price
-                    oco_jump_stop_price = self.strategy.oco_jump_sell_stop_price
-                    oco_limit_price = self.strategy.oco_sell_limit_price
-                    oco_stop_price = self.strategy.oco_sell_stop_price
-
-                # Generate the order parameters.
-                if self.strategy.oco_loop_order and self.state['next_order_side'] == 'sell':
-                    order_parameters = {
-                        'symbol': self.symbol,
-                        'qty': self.strategy.quantity,
-                        'side': self.state['next_order_side'],
-                        'type': 'limit',
-                        'time_in_force': self.strategy.time_in_force,
-                        'order_class': 'oco',
-                        'take_profit': {'limit_price': oco_limit_price},
-                        'stop_loss': {'stop_price': oco_stop_price},
-                        'client_order_id': self._generate_order_id('loop')}
-                else:
-                    order_parameters = {
-                        'symbol': self.symbol,
-                        'qty': self.strategy.quantity,
-                        'side': self.state['next_order_side'],
-                        'type': self.strategy.loop_order_type,
-                        'time_in_force': self.strategy.time_in_force,
-                        'limit_price': limit_price,
-                        'stop_price': stop_price,
-                        'client_order_id' : self._generate_order_id('loop')}
+                next_order_side = self.state['next_order_side']
+                order_parameters = self._order_parameters('loop', next_order_side)
 
                 # Try to create the order.
-                self.log.info('Creating loop order: {}'.format(order_parameters))
-                while self.retry_order_creation > 0:
-                    order = self.submit_order(order_parameters)
-                    if order:
-                        time.sleep(self.order_status_check_delay)
-                        order = self.get_order(order['id'])
-                        if order['status'] != 'rejected':
-                            self.retry_order_creation = self.config.retry_order_creation
-                            break
-                        else:
-                            self.log.info('The loop order was rejected: {}'.format(order))
-                    self.log.info('Creating loop order failed. Retries left: {}'.format(self.retry_order_creation))
-                    order_parameters['client_order_id'] = self._generate_order_id('loop')
-                    self.retry_order_creation -= 1
+                self.log.info('Creating loop order: %s', order_parameters)
+                order = self._submit_with_retries(order_parameters, 'loop', 'loop')
 
                 # If order creation failed <retry_order_creation> times we will try to use the jump order price.
-                if not order or order['status'] == 'rejected':
-                    self.retry_order_creation = self.config.retry_order_creation
-                    if self.strategy.oco_loop_order and order_parameters['side'] == 'sell':
-                        order_parameters.update({
-                            'order_class': 'oco',
-                            'stop_loss': {'stop_price': oco_jump_stop_price},
-                            'take_profit': {'limit_price': oco_jump_limit_price},
-                            'client_order_id': self._generate_order_id('loop')})
-                    else:
-                        order_parameters.update({
-                            'limit_price': jump_limit_price,
-                            'stop_price': jump_stop_price,
-                            'client_order_id': self._generate_order_id('loop')})
-                    while self.retry_order_creation > 0:
-                        order = self.submit_order(order_parameters)
-                        if order:
-                            time.sleep(self.order_status_check_delay)
-                            order = self.get_order(order['id'])
-                            if order['status'] != 'rejected':
-                                self.retry_order_creation = self.config.retry_order_creation
-                                break
-                            else:
-                                self.log.info('The loop jump order was rejected: {}'.format(order))
-                        self.log.info('Creating loop jump order failed. Retries left: {}'.format(self.retry_order_creation))
-                        order_parameters['client_order_id'] = self._generate_order_id('loop')
-                        self.retry_order_creation -= 1
+                if not order:
+                    order_parameters.update(self._jump_templates[next_order_side])
+                    order_parameters['client_order_id'] = self._generate_order_id('loop')
+                    order = self._submit_with_retries(order_parameters, 'loop', 'loop jump')
 
                 # If order creation failed after all attempts terminate Trader.
                 if not order:
-                    termination_reason = 'Creating loop order failed after {} retries.'.format(self.retry_order_creation*2)
-                    if self.strategy.enable_email_monitoring:
-                        response = self._send_termination_alert(reason=termination_reason)
-                        self.log.info(response)
-                    self._terminate(reason=termination_reason)
+                    # Each of the loop and jump orders was submitted retry_order_creation times.
+                    termination_reason = 'Creating loop order failed after {} attempts.'.format(
+                        self.config.retry_order_creation * 2)
+                    self._terminate(reason=termination_reason, alert=True)
 
-                self.log.info('Order status: {}'.format(order['status']))
+                self._track_order(order, next_order_side)
+
+    def _submit_with_retries(self, order_parameters, prefix, name):
+        '''
+        Submit an order and check its status after order_status_check_delay.
+        Failed and rejected orders are submitted again up to
+        retry_order_creation times. Before a failed order is submitted
+        again it is looked up by its client order id in case it was
+        created, so the client order id is only replaced after a rejection.
+        A created order is returned even if its status can't be checked,
+        so it's never submitted twice.
 
-                # Keep track of the order id and next order side.
-                self.state['last_order_id'] = order['id']
-                self.state['next_order_side'] = self.state['side_map'][self.state['next_order_side']]
+        Arguments:
+        order_parameters (dict) : The order parameters.
+        prefix (str) : The client order id prefix.
+        name (str) : The order name used in the log.
+
+        Returns: Dict or None if all attempts failed or were rejected.
+        '''
+        retries = self.config.retry_order_creation
+        while retries > 0:
+            order = self.submit_order(order_parameters)
+            if not order:
+                try:
+                    order = self.find_order(order_parameters['client_order_id'])
+                except REQUEST_ERRORS as err:
+                    # The client order id is kept, so if the order exists
+                    # submitting it again is refused instead of duplicated.
+                    self.log.warning('Looking up the %s order failed: %s', name, err)
+                if order:
+                    self.log.info('The %s order was created despite the error.', name)
+            if order:
+                time.sleep(self.order_status_check_delay)
+                try:
+                    order = self.get_order(order['id'])
+                except Exception:
+                    # The order exists so it's tracked and checked by the loop.
+                    self.log.warning('Checking the %s order failed.', name, exc_info=True)
+                    return order
+                if order['status'] != 'rejected':
+                    return order
+                self.log.info('The %s order was rejected: %s', name, order)
+                order_parameters['client_order_id'] = self._generate_order_id(prefix)
+            self.log.info('Creating %s order failed. Retries left: %s', name, retries)
+            retries -= 1
+        return None
+
+    def _order_parameters(self, phase, side):
+        '''
+        Generate the parameters of a new order from the template of the
+        phase and side.
+
+        Arguments:
+        phase (str) : initial or loop, also used as the client order id prefix.
+        side (str) : buy or sell.
+
+        Returns: Dict
+        '''
+        order_parameters = dict(self._phase_templates[phase][side])
+        order_parameters['client_order_id'] = self._generate_order_id(phase)
+        return order_parameters
+
+    def _track_order(self, order, side):
+        '''
+        Keep track of the order id, status and next order side
+        after an order is placed.
+
+        Arguments:
+        order (dict) : The placed order.
+        side (str) : The side of the placed order.
+        '''
+        self.log.info('Order status: %s', order['status'])
+        self.state['last_order_id'] = order['id']
+        self.state['last_order_status'] = order['status']
+        self.state['poll_gap'] = self.initial_poll_gap
+        self.state['next_order_side'] = self._SIDE_MAP[side]
+        self.state_log.append(order['id'], self.state['next_order_side'])
+
+    def _build_order_templates(self):
+        '''
+        Build the initial and loop order parameters (without client_order_id)
+        for each side and the parameters which replace them in jump orders.
+        The templates are read-only, orders are created from a copy.
+        '''
+        strategy = self.strategy
+        self._initial_templates = {}
+        self._order_templates = {}
+        self._jump_templates = {}
+        for side in self._SIDE_MAP:
+            if strategy.oco_initial_order:
+                self._initial_templates[side] = {
+                    'symbol': self.symbol,
+                    'qty': strategy.quantity,
+                    'side': side,
+                    'type': 'limit',
+                    'time_in_force': strategy.time_in_force,
+                    'order_class': 'oco',
+                    'take_profit': {'limit_price': getattr(strategy, f'oco_initial_{side}_limit_price')},
+                    'stop_loss': {'stop_price': getattr(strategy, f'oco_initial_{side}_stop_price')}}
+            else:
+                self._initial_templates[side] = {
+                    'symbol': self.symbol,
+                    'qty': strategy.quantity,
+                    'side': side,
+                    'type': strategy.initial_order_type,
+                    'time_in_force': strategy.time_in_force,
+                    'limit_price': getattr(strategy, f'initial_{side}_limit_price'),
+                    'stop_price': getattr(strategy, f'initial_{side}_stop_price')}
+
+            if strategy.oco_loop_order and side == 'sell':
+                self._order_templates[side] = {
+                    'symbol': self.symbol,
+                    'qty': strategy.quantity,
+                    'side': side,
+                    'type': 'limit',
+                    'time_in_force': strategy.time_in_force,
+                    'order_class': 'oco',
+                    'take_profit': {'limit_price': strategy.oco_sell_limit_price},
+                    'stop_loss': {'stop_price': strategy.oco_sell_stop_price}}
+                self._jump_templates[side] = {
+                    'order_class': 'oco',
+                    'stop_loss': {'stop_price': strategy.oco_jump_sell_stop_price},
+                    'take_profit': {'limit_price': strategy.oco_jump_sell_limit_price}}
+            else:
+                self._order_templates[side] = {
+                    'symbol': self.symbol,
+                    'qty': strategy.quantity,
+                    'side': side,
+                    'type': strategy.loop_order_type,
+                    'time_in_force': strategy.time_in_force,
+                    'limit_price': getattr(strategy, f'loop_{side}_limit_price'),
+                    'stop_price': getattr(strategy, f'loop_{side}_stop_price')}
+                self._jump_templates[side] = {
+                    'limit_price': getattr(strategy, f'jump_{side}_limit_price'),
+                    'stop_price': getattr(strategy, f'jump_{side}_stop_price')}
+
+            # Only the top level is read-only. The nested take_profit and stop_loss
+            # dicts stay plain dicts because the parameters are serialized to JSON,
+            # submit_order copies them so the templates are not modified.
+            for templates in (self._initial_templates, self._order_templates, self._jump_templates):
+                templates[side] = types.MappingProxyType(templates[side])
+
+        self._phase_templates = {
+            'initial': self._initial_templates,
+            'loop': self._order_templates}
 
     def _make_strategy_safe(self):
         '''
         Check the set of parameters in the strategy and make sure
         that unneeded ones are set to None and needed ones are not.
         '''
-        initial_trade_price = self.strategy.initial_trade_price
-        initial_limit_spread = self.strategy.initial_limit_spread
-        loop_signal_price = self.strategy.loop_signal_price
-        loop_trade_spread = self.strategy.loop_trade_spread
-        loop_limit_spread = self.strategy.loop_limit_spread
-        jump_loop_order = self.strategy.jump_loop_order
-        jump_limit_spread = self.strategy.jump_limit_spread
-        initial_oco_price = self.strategy.initial_oco_price
-
-        # We can't have market loop orders.
-        assert self.strategy.loop_order_type != 'market'
+        initial_order_type = self.strategy.initial_order_type
+        loop_order_type = self.strategy.loop_order_type
+        if initial_order_type not in INITIAL_PRICES:
+            raise ValueError('Invalid initial_order_type: {}'.format(initial_order_type))
+        if loop_order_type not in LOOP_PRICES:
+            raise ValueError('Invalid loop_order_type: {}'.format(loop_order_type))
 
         # Generate explicit order prices from the prices in the strategy.
-        if self.strategy.initial_order_type == 'market':
-            self.strategy.initial_buy_limit_price = None
-            self.strategy.initial_buy_stop_price = None
-            self.strategy.initial_sell_limit_price = None
-            self.strategy.initial_sell_stop_price = None
-
-        if self.strategy.initial_order_type == 'limit':
-            self.strategy.initial_buy_limit_price = initial_trade_price
-            self.strategy.initial_sell_limit_price = initial_trade_price
-            self.strategy.initial_buy_stop_price = None
-            self.strategy.initial_sell_stop_price = None
-
-        if self.strategy.loop_order_type == 'limit':
-            self.strategy.loop_buy_limit_price = loop_signal_price + loop_trade_spread + loop_limit_spread
-            self.strategy.loop_sell_limit_price = loop_signal_price - loop_trade_spread - loop_limit_spread
-            self.strategy.loop_buy_stop_price = None
-            self.strategy.loop_sell_stop_price = None
-            self.strategy.jump_buy_limit_price = loop_signal_price + jump_loop_order + jump_limit_spread
-            self.strategy.jump_sell_limit_price = loop_signal_price - jump_loop_order - jump_limit_spread
-            self.strategy.jump_buy_stop_price = None
-            self.strategy.jump_sell_stop_price = None
-
-        if self.strategy.initial_order_type == 'stop':
-            self.strategy.initial_buy_limit_price = None
-            self.strategy.initial_sell_limit_price = None
-            self.strategy.initial_buy_stop_price = initial_trade_price
-            self.strategy.initial_sell_stop_price = initial_trade_price
-
-        if self.strategy.loop_order_type == 'stop':
-            self.strategy.loop_buy_limit_price = None
-            self.strategy.loop_sell_limit_price = None
-            self.strategy.loop_buy_stop_price = loop_signal_price + loop_trade_spread
-            self.strategy.loop_sell_stop_price = loop_signal_price - loop_trade_spread
-            self.strategy.jump_buy_limit_price = None
-            self.strategy.jump_sell_limit_price = None
-            self.strategy.jump_buy_stop_price = loop_signal_price + jump_loop_order
-            self.strategy.jump_sell_stop_price = loop_signal_price - jump_loop_order
-
-        if self.strategy.initial_order_type == 'stop_limit':
-            self.strategy.initial_buy_stop_price = initial_trade_price
-            self.strategy.initial_sell_stop_price = initial_trade_price
-            self.strategy.initial_buy_limit_price = self.strategy.initial_buy_stop_price + initial_limit_spread
-            self.strategy.initial_sell_limit_price = self.strategy.initial_buy_stop_price - initial_limit_spread
-
-        if self.strategy.loop_order_type == 'stop_limit':
-            self.strategy.loop_buy_stop_price = loop_signal_price + loop_trade_spread
-            self.strategy.loop_sell_stop_price = loop_signal_price - loop_trade_spread
-            self.strategy.loop_buy_limit_price = self.strategy.loop_buy_stop_price + loop_limit_spread
-            self.strategy.loop_sell_limit_price = self.strategy.loop_sell_stop_price - loop_limit_spread
-
-            self.strategy.jump_buy_stop_price = loop_signal_price + jump_loop_order
-            self.strategy.jump_sell_stop_price = loop_signal_price - jump_loop_order
-            self.strategy.jump_buy_limit_price = self.strategy.jump_buy_stop_price + jump_limit_spread
-            self.strategy.jump_sell_limit_price = self.strategy.jump_sell_stop_price - jump_limit_spread
+        (self.strategy.initial_buy_limit_price,
+         self.strategy.initial_buy_stop_price,
+         self.strategy.initial_sell_limit_price,
+         self.strategy.initial_sell_stop_price) = INITIAL_PRICES[initial_order_type](self.strategy)
+
+        (self.strategy.loop_buy_limit_price,
+         self.strategy.loop_buy_stop_price,
+         self.strategy.loop_sell_limit_price,
+         self.strategy.loop_sell_stop_price,
+         self.strategy.jump_buy_limit_price,
+         self.strategy.jump_buy_stop_price,
+         self.strategy.jump_sell_limit_price,
+         self.strategy.jump_sell_stop_price) = LOOP_PRICES[loop_order_type](self.strategy)
 
         # OCO orders are handles as special case.
-        # Initial OCO order.
-        self.strategy.oco_initial_buy_limit_price = initial_oco_price - initial_limit_spread
-        self.strategy.oco_initial_sell_limit_price = initial_oco_price + initial_limit_spread
-        self.strategy.oco_initial_buy_stop_price = initial_oco_price
-        self.strategy.oco_initial_sell_stop_price = initial_oco_price
-
-        # Loop OCO orders.
-        self.strategy.oco_buy_limit_price = self.strategy.oco_limit_price
-        self.strategy.oco_sell_limit_price = self.strategy.oco_limit_price
-        self.strategy.oco_buy_stop_price = loop_signal_price + loop_trade_spread
-        self.strategy.oco_sell_stop_price = loop_signal_price - loop_trade_spread
-        # Jump OCO orders.
-        self.strategy.oco_jump_buy_limit_price = self.strategy.oco_limit_price + jump_loop_order + jump_limit_spread
-        self.strategy.oco_jump_sell_limit_price = self.strategy.oco_limit_price + jump_loop_order + jump_limit_spread
-        self.strategy.oco_jump_buy_stop_price = loop_signal_price - jump_loop_order
-        self.strategy.oco_jump_sell_stop_price = loop_signal_price - jump_loop_order
+        for name, price in OCO_PRICES(self.strategy).items():
+            setattr(self.strategy, name, price)
 
     def _generate_order_id(self, prefix):
         '''
         Generate unique client order name. The max length of client order id is 48.
+        The name is the prefix, the order number in this process and the random
+        token of the process, e.g. loop-0000007b-a1b2c3d4.
         '''
-        order_id = '{}-{}'.format(prefix, uuid.uuid4().hex)
-        return order_id[:48]
+        return f'{prefix}-{next(self._order_counter):08x}-{ORDER_ID_TOKEN}'
 
     def _log_order_status(self, order):
         '''
@@ -622,36 +972,29 @@ class Trader(threading.Thread):
         either "initial" or "loop", otherwise it will log the order type as
         "general" which should be avoided as it will make the log less helpful.
         '''
-        if 'initial' in order['client_order_id']:
-            order_type = 'initial'
-        elif 'loop' in order['client_order_id']:
-            order_type = 'loop'
-        else:
-            order_type = 'general'
+        prefix = order['client_order_id'].partition('-')[0]
+        order_type = prefix if prefix in ORDER_ID_PREFIXES else 'general'
 
         self.log.info(
-            'The last {} {} order was filled at: {}'.format(
+            'The last %s %s order was filled at: %s',
             order_type,
             order['side'],
-            order['filled_avg_price']))
+            order['filled_avg_price'])
 
-    def _send_status_email(self, order):
+    def _send_status_email(self, order, now):
         '''
         Compare the timestamp of the last send email and it is more than
-        the desired frequency send new email.
-        '''
+        the desired frequency send new email. The email is queued and sent
+        by a background thread.
+        Only called when email monitoring is enabled.
 
-        # Check if email notifications are enabled.
-        if not self.strategy.enable_email_monitoring:
-            return
+        Arguments:
+        order (dict) : The last order.
+        now (float) : The current time.time() of the update.
+        '''
 
         # The time difference is current time minus last email time in seconds.
-        time_diff = time.time() - self.last_email_timestamp
-
-        # We need to convert the email frequency to monutes by multiplying it with
-        # 60 because the time difference we are going to compare it with is in seconds
-        # while the email_monitoring_frequency is intended to represent minutes.
-        email_frequency_in_minutes = self.strategy.email_monitoring_frequency * 60
+        time_diff = now - self.last_email_timestamp
 
         # Initially we will assume the subject is normal statis update and
         # it should not be send immediately.
@@ -665,22 +1008,9 @@ class Trader(threading.Thread):
             subject = 'Rejected order'
             send_immediately = True
 
-        if (time_diff >= email_frequency_in_minutes) or send_immediately:
-            message = '''
-            Open Position: {position_size} {position_symbol} <br>
-            Active Order: {side} {quantity} {symbol} {price} <br>
-            Order Status: {status}
-            '''
-
-            open_orders = self.get_orders(status='open')
-
-            # Check which set of order prices we will use.
-            if self.state['next_order_side'] == 'buy':
-                loop_limit_price = self.strategy.loop_buy_limit_price
-                loop_stop_price = self.strategy.loop_buy_stop_price
-            elif self.state['next_order_side'] == 'sell':
-                loop_limit_price = self.strategy.loop_sell_limit_price
-                loop_stop_price = self.strategy.loop_sell_stop_price
+        if (time_diff >= self.email_monitoring_interval) or send_immediately:
+            # Use the loop price of the next order side.
+            loop_limit_price = self.loop_limit_prices[self.state['next_order_side']]
 
             # Get the current open position size. If there is no open position for the symbol
             # the get_position function will return None. In this case we set position_size to 0.
@@ -691,7 +1021,7 @@ class Trader(threading.Thread):
                 position_size = 0
 
             # Add variables to the message template.
-            message = message.format(
+            message = self._STATUS_EMAIL.format(
                 price=loop_limit_price,
                 symbol=order['symbol'],
                 side=order['side'],
@@ -700,47 +1030,88 @@ class Trader(threading.Thread):
                 position_symbol=self.symbol,
                 position_size=position_size)
 
-            # Send the email.
-            self.email_sender.send(
-                from_email=self.config.email_monitoring_sending_email,
-                to_email=self.config.email_monitoring_receiving_email,
-                subject=subject,
-                message=message)
+            # Queue the email. It is dropped if the email API can't keep up.
+            try:
+                self.email_queue.put_nowait({
+                    'from_email': self.config.email_monitoring_sending_email,
+                    'to_email': self.config.email_monitoring_receiving_email,
+                    'subject': subject,
+                    'message': message})
+            except queue.Full:
+                self.log.warning('Too many status emails queued, dropping: %s', subject)
 
             # Update the last email timestamp.
-            self.last_email_timestamp = time.time()
+            self.last_email_timestamp = now
 
     def _send_termination_alert(self, reason):
         '''
-        Called when the system is terminating.
-        '''
-        subject = 'Terminating'
-        message = '''
-        The system has terminated.<br>
-        Reason: {reason}
+        Called when the system is terminating. The alert is queued and sent
+        by the email thread, which is flushed by _terminate.
+        Only called when email monitoring is enabled.
         '''
-        message = message.format(reason=reason)
-
-        result = self.email_sender.send(
-            from_email=self.config.email_monitoring_sending_email,
-            to_email=self.config.email_monitoring_receiving_email,
-            subject=subject,
-            message=message)
-        return result
-
-    def _terminate(self, reason=None):
+        try:
+            self.email_queue.put_nowait({
+                'from_email': self.config.email_monitoring_sending_email,
+                'to_email': self.config.email_monitoring_receiving_email,
+                'subject': 'Terminating',
+                'message': self._TERMINATION_EMAIL.format(reason=reason)})
+        except queue.Full:
+            self.log.warning('Too many emails queued, dropping the termination alert.')
+
+    def _terminate(self, reason=None, alert=False):
         '''
-        Cancel all orders and terminate the system.
+        Cancel all orders and terminate the system. The orders are canceled
+        in a separate thread so the termination doesn't hang for more than
+        CANCEL_TIMEOUT seconds if the API is not responding. The termination
+        alert is sent after the orders are canceled so a slow email API
+        can't delay the cancellation. The saved state is always cleared
+        because the tracked order is being canceled and it can't be resumed
+        on the next start.
 
         Arguments:
         reason (str) : The reason for the termination.
+        alert (bool) : Send the termination alert if email monitoring is enabled.
         '''
         if reason:
             self.log.info(reason)
-        self.log.info(f'Canceling all {self.symbol} orders and terminating.')
-        self.cancel_symbol_orders()
+        self.log.info('Canceling all %s orders and terminating.', self.symbol)
+
+        def cancel():
+            try:
+                self.cancel_symbol_orders()
+            except Exception:
+                self.log.error('Canceling the orders failed.', exc_info=True)
+
+        # The thread has the name of the Trader so it shows up in the log format.
+        canceller = threading.Thread(target=cancel, name=self.name, daemon=True)
+        canceller.start()
+        canceller.join(CANCEL_TIMEOUT)
+        if canceller.is_alive():
+            self.log.error('Canceling the orders timed out after %s seconds.', CANCEL_TIMEOUT)
+
+        if alert and self.enable_email_monitoring:
+            self._send_termination_alert(reason=reason)
+        self._stop_email_thread()
+        self.state_log.clear()
         raise SystemExit
 
+    def _stop_email_thread(self):
+        '''
+        Stop the email thread after it has sent the queued emails (including
+        the termination alert), waiting at most EMAIL_FLUSH_TIMEOUT seconds.
+        '''
+        if not self.enable_email_monitoring or self.email_thread is None:
+            return
+        deadline = time.monotonic() + EMAIL_FLUSH_TIMEOUT
+        try:
+            self.email_queue.put(None, timeout=EMAIL_FLUSH_TIMEOUT)
+        except queue.Full:
+            pass
+        self.email_thread.join(max(0, deadline - time.monotonic()))
+        if self.email_thread.is_alive():
+            self.log.warning('Sending the queued emails timed out after %s seconds.',
+                             EMAIL_FLUSH_TIMEOUT)
+
     def _submit_order_with_instructions(self, symbol, qty,
                     side, type, time_in_force, limit_price=None,
                     stop_price=None, client_order_id=None,
@@ -756,7 +1127,7 @@ class Trader(threading.Thread):
             'side':          side,
             'type':          type,
             'time_in_force': time_in_force,
-            'instructions': self.strategy.order_instructions
+            'instructions': self.order_instructions
         }
         if limit_price is not None:
             params['limit_price'] = float(limit_price)
@@ -1,7 +1,6 @@
 import zmq
 import time
 import logging
-import traceback
 
 class Server:
     def __init__(self):
@@ -9,6 +8,11 @@ class Server:
         self.socket = self.context.socket(zmq.REP)
         self.socket.bind("tcp://*:5555")
 
+        # The updated orders are published so the traders don't have
+        # to wait for their next update or request them to see them.
+        self.publisher = self.context.socket(zmq.PUB)
+        self.publisher.bind("tcp://*:5556")
+
         self.last_updated = time.time()
         self.orders = {}
 
@@ -16,9 +20,18 @@ class Server:
         while True:
             message = self.socket.recv_json()
             if message['action'] == 'read':
+                # Send only the requested order if an order id is given
+                # instead of serializing all orders on every read.
+                order_id = message.get('order_id')
+                if order_id is None:
+                    orders = self.orders
+                elif order_id in self.orders:
+                    orders = {order_id: self.orders[order_id]}
+                else:
+                    orders = {}
                 response = {
                     'last_updated': self.last_updated,
-                    'orders': self.orders}
+                    'orders': orders}
                 self.socket.send_json(response, zmq.NOBLOCK)
 
             elif message['action'] == 'write':
@@ -26,6 +39,15 @@ class Server:
                 order = message['data']
                 self.orders[order['id']] = order
                 self.socket.send_json({'status': 'ok'})
+                self.publisher.send_json(order)
+
+            elif message['action'] == 'write_batch':
+                self.last_updated = time.time()
+                for order in message['data']:
+                    self.orders[order['id']] = order
+                self.socket.send_json({'status': 'ok'})
+                for order in message['data']:
+                    self.publisher.send_json(order)
 
 
 class Client:
@@ -34,8 +56,10 @@ class Client:
         self.socket = self.context.socket(zmq.REQ)
         self.socket.connect("tcp://localhost:5555")
 
-    def read(self):
+    def read(self, order_id=None):
         message = {'action': 'read'}
+        if order_id is not None:
+            message['order_id'] = order_id
         self.socket.send_json(message)
         return self.socket.recv_json()
 
@@ -44,23 +68,70 @@ class Client:
         self.socket.send_json(message)
         self.socket.recv_json()
 
+    def write_batch(self, data):
+        '''
+        Write a list of orders in a single request. Later orders
+        replace earlier ones with the same id.
+        '''
+        message = {'action': 'write_batch', 'data': data}
+        self.socket.send_json(message)
+        self.socket.recv_json()
+
+
+class Subscriber:
+    '''
+    Receives the orders updated on the server.
+    '''
+    def __init__(self):
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt_string(zmq.SUBSCRIBE, '')
+        self.socket.connect("tcp://localhost:5556")
+
+    def wait(self, timeout, order_id=None):
+        '''
+        Wait until the order is updated or the timeout expires.
+
+        Arguments:
+        timeout (float) : The maximum wait in seconds.
+        order_id (str) : The id of the order. If None it just sleeps.
+
+        Returns: The updated order dict or None if it wasn't updated.
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if not self.socket.poll(remaining * 1000):
+                return None
+            order = self.socket.recv_json()
+            if order['id'] == order_id:
+                return order
+
 
 def construct_logger(filename):
-    log_headers = [logging.FileHandler(filename), logging.StreamHandler()]
-    log_format = '%(asctime)s [%(levelname)s] %(message)s'
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=log_headers)
-    return logging.getLogger(__name__)
+    '''
+    Create the logger of this script. The handlers are added to a named
+    logger instead of the root logger so the records of the libraries
+    are not written to the log file, and only once if it is called again.
+    '''
+    logger = logging.getLogger(__name__)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+        for handler in (logging.FileHandler(filename), logging.StreamHandler()):
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+    return logger
 
 if __name__ == '__main__':
     log = construct_logger('zmq_server.log')
     try:
         zmq_server = Server()
         zmq_server.run()
-    except:
+    except Exception:
         zmq_server.context.destroy()
-        err = traceback.format_exc()
-        log.error(f'ZMQ failed: {err}')
+        log.error('ZMQ failed.', exc_info=True)
         time.sleep(5)